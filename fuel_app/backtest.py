@@ -0,0 +1,270 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import argparse
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from fuel_app.data import (
+    AGGREGATES_PATH,
+    STATIONS_PATH,
+    load_prix,
+    prepare_stations,
+    prix_source,
+    signature_digest,
+)
+from fuel_app.forecast import fit_trends, predict_rows
+from fuel_app.prices import long_prices
+from fuel_app.store import departement, write_aggregate
+
+# Days ahead of the origin the models are evaluated on
+MAX_HORIZON = 7
+
+# Days of prices a model is trained on at the first origin
+MIN_TRAIN_DAYS = 7
+
+ERROR_SUM_COLUMNS = ["N", "Sum_error", "Sum_abs", "Sum_sq", "Sum_ape"]
+
+
+# --------------
+# --- MODELS ---
+# --------------
+
+# A model predicts the price of target rows (ID, Fuel, Date) from the prices
+# known at the origin (df_train, with the columns of the prepared prices),
+# for all the stations at once: it returns the predicted prices aligned with
+# df_targets, NaN when it cannot predict a row. Models run in worker
+# processes, so they must be module level functions (or partials of them).
+
+
+def _lookup(df_targets, values):
+    return df_targets[["ID", "Fuel"]].merge(
+        values.rename("Predicted").reset_index(), on=["ID", "Fuel"], how="left"
+    )["Predicted"]
+
+
+# Linear trend of each (station, fuel), the model of the AI model page (see
+# fuel_app.forecast), fitted on the last train_days days if given
+def linear_trend_model(df_train, df_targets, train_days=None):
+    if train_days is not None:
+        start = df_train["Date"].max() - pd.Timedelta(days=train_days - 1)
+        df_train = df_train[df_train["Date"] >= start]
+    return predict_rows(fit_trends(df_train), df_targets)
+
+
+# Last known price of each (station, fuel)
+def last_price_model(df_train, df_targets):
+    df_long = long_prices(df_train).sort_values(by="Date", kind="stable")
+    last = df_long.groupby(["ID", "Fuel"], observed=True)["Price"].last()
+    return _lookup(df_targets, last).to_numpy()
+
+
+# Mean price of each (station, fuel) over the last days days
+def window_mean_model(df_train, df_targets, days=7):
+    start = df_train["Date"].max() - pd.Timedelta(days=days - 1)
+    df_long = long_prices(df_train[df_train["Date"] >= start])
+    mean = df_long.groupby(["ID", "Fuel"], observed=True)["Price"].mean()
+    return _lookup(df_targets, mean).to_numpy()
+
+
+MODELS = {
+    "linear_trend": linear_trend_model,
+    "linear_trend_7d": functools.partial(linear_trend_model, train_days=7),
+    "last_price": last_price_model,
+    "window_mean_7d": window_mean_model,
+}
+
+
+# -------------------
+# --- BACKTESTING ---
+# -------------------
+
+# Rolling origin evaluation: for each origin date, every model is trained on
+# the prices up to the origin and predicts the prices of the next max_horizon
+# days, compared with the actual prices. Only past prices are used at each
+# origin, unlike a random split of the rows.
+
+
+# Origins from min_train_days after the first date, every step days, leaving
+# at least one day to predict
+def rolling_origins(dates, min_train_days=MIN_TRAIN_DAYS, step=1):
+    dates = pd.DatetimeIndex(sorted(pd.unique(dates)))
+    first = dates[0] + pd.Timedelta(days=min_train_days - 1)
+    return [date for date in dates[dates >= first][:-1]][::step]
+
+
+# Error sums of every model at one origin, indexed by (Model, ID, Fuel,
+# Horizon). Sums (not means) are returned so that the errors of any group of
+# stations, fuels, origins or horizons are computed exactly from them. The
+# training and target rows are selected once for all the models.
+def backtest_origin(models, df_prix, origin, max_horizon=MAX_HORIZON):
+    origin = pd.Timestamp(origin)
+    df_train = df_prix[df_prix["Date"] <= origin]
+    end = origin + pd.Timedelta(days=max_horizon)
+    df_targets = long_prices(
+        df_prix[(df_prix["Date"] > origin) & (df_prix["Date"] <= end)]
+    ).reset_index(drop=True)
+    actual = df_targets["Price"].to_numpy()
+    horizon = (df_targets["Date"] - origin).dt.days.astype(np.int16)
+
+    sums = {}
+    for name, model in models.items():
+        error = np.asarray(model(df_train, df_targets), dtype=float) - actual
+        df_errors = pd.DataFrame(
+            {
+                "ID": df_targets["ID"],
+                "Fuel": df_targets["Fuel"],
+                "Horizon": horizon,
+                "N": 1,
+                "Sum_error": error,
+                "Sum_abs": np.abs(error),
+                "Sum_sq": error**2,
+                "Sum_ape": np.abs(error) / actual,
+            }
+        )
+        df_errors = df_errors[~np.isnan(error)]
+        sums[name] = df_errors.groupby(["ID", "Fuel", "Horizon"], observed=True)[
+            ERROR_SUM_COLUMNS
+        ].sum()
+    return pd.concat(sums, names=["Model"])
+
+
+# Prices of the worker processes, sent once to each worker when the pool
+# starts instead of with every task
+_worker_prix = None
+
+
+def _init_worker(df_prix):
+    global _worker_prix
+    _worker_prix = df_prix
+
+
+def _backtest_task(models, origin, max_horizon):
+    return backtest_origin(models, _worker_prix, origin, max_horizon)
+
+
+# Error sums of every model, summed over the origins, indexed by (Model, ID,
+# Fuel, Horizon). There is one task per origin, running all the models. With
+# workers, the tasks run in a pool of that many processes, each receiving the
+# prices once; the tasks only carry the models and their origin.
+def backtest(
+    df_prix,
+    models=MODELS,
+    origins=None,
+    max_horizon=MAX_HORIZON,
+    workers=None,
+):
+    df_prix = df_prix.rename(columns={"id": "ID"})
+    if origins is None:
+        origins = rolling_origins(df_prix["Date"])
+
+    if workers is None:
+        results = [
+            backtest_origin(models, df_prix, origin, max_horizon) for origin in origins
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(df_prix,)
+        ) as pool:
+            futures = [
+                pool.submit(_backtest_task, models, origin, max_horizon)
+                for origin in origins
+            ]
+            results = [future.result() for future in futures]
+
+    if not results:
+        return pd.DataFrame(columns=ERROR_SUM_COLUMNS)
+    df_sums = pd.concat(results).groupby(
+        level=["Model", "ID", "Fuel", "Horizon"], observed=True
+    )
+    return df_sums.sum().astype({"N": np.int64})
+
+
+# Errors of each group of the error sums (by model, enseigne, department and
+# horizon by default): mean error (bias, > 0 when the model predicts too
+# high), mean absolute error, root mean squared error (in €/L) and mean
+# absolute percentage error
+def error_table(
+    df_sums, df_stations, by=("Model", "Enseignes", "Departement", "Horizon")
+):
+    df_groups = pd.DataFrame(
+        {
+            "ID": df_stations["ID"].astype(int),
+            "Enseignes": df_stations["Enseignes"],
+            "Departement": departement(df_stations["CP"]),
+        }
+    )
+    df_sums = df_sums.reset_index().merge(df_groups, on="ID", how="left")
+    df_table = df_sums.groupby(list(by), observed=True)[ERROR_SUM_COLUMNS].sum()
+
+    n = df_table["N"]
+    return pd.DataFrame(
+        {
+            "N": n,
+            "Bias": df_table["Sum_error"] / n,
+            "MAE": df_table["Sum_abs"] / n,
+            "RMSE": np.sqrt(df_table["Sum_sq"] / n),
+            "MAPE (%)": 100 * df_table["Sum_ape"] / n,
+        }
+    )
+
+
+# -----------
+# --- CLI ---
+# -----------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rolling origin backtest of the price models on all the "
+        "stations and fuels"
+    )
+    parser.add_argument("models", nargs="*", help=f"default: all ({', '.join(MODELS)})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-horizon", type=int, default=MAX_HORIZON)
+    parser.add_argument("--min-train-days", type=int, default=MIN_TRAIN_DAYS)
+    parser.add_argument("--step", type=int, default=1, help="days between origins")
+    parser.add_argument(
+        "--by",
+        nargs="+",
+        default=["Model", "Enseignes", "Departement", "Horizon"],
+        help="columns of the error table",
+    )
+    parser.add_argument("--csv", type=Path, help="write the error table to this file")
+    args = parser.parse_args()
+    unknown = set(args.models) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+    unknown = set(args.by) - {"Model", "Enseignes", "Departement", "Horizon", "Fuel"}
+    if unknown:
+        parser.error(f"unknown columns: {', '.join(sorted(unknown))}")
+
+    df_prix = load_prix()
+    models = {name: MODELS[name] for name in args.models or MODELS}
+    origins = rolling_origins(
+        df_prix["Date"], min_train_days=args.min_train_days, step=args.step
+    )
+
+    start = time.perf_counter()
+    df_sums = backtest(
+        df_prix, models, origins, max_horizon=args.max_horizon, workers=args.workers
+    )
+    print(
+        f"{len(models)} models x {len(origins)} origins backtested in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+    # Saved with the version of the prices, for the AI model page
+    write_aggregate(
+        df_sums, AGGREGATES_PATH, "backtest", signature_digest(prix_source()[1])
+    )
+
+    df_stations = prepare_stations(pd.read_csv(STATIONS_PATH))
+    df_table = error_table(df_sums, df_stations, by=args.by)
+    if args.csv:
+        df_table.to_csv(args.csv)
+    print(error_table(df_sums, df_stations, by=["Model", "Horizon"]).round(4))
@@ -0,0 +1,250 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from fuel_app.backtest import MODELS, backtest_origin
+from fuel_app.cube import build_price_cube, cube_table
+from fuel_app.data import prepare_prix, prepare_stations, split_carrefour
+from fuel_app.forecast import fit_trends, predict
+from fuel_app.gaps import price_gaps
+from fuel_app.heatmap import build_price_grid
+from fuel_app.kpi_table import kpi_table_html
+from fuel_app.moves import competitor_moves, price_moves
+from fuel_app.neighbours import CompetitorGraph, find_neighbours
+from fuel_app.outliers import clip_outliers
+from fuel_app.prices import PriceIndex
+from fuel_app.schema import FUEL_COLUMNS
+from fuel_app.synthetic import synthetic_prix, synthetic_stations
+
+# Number of stations looked up by the per-station benchmarks (one lookup per
+# page rerun in the app)
+N_LOOKUPS = 100
+
+
+# -------------
+# --- SETUP ---
+# -------------
+
+
+# Synthetic raw files and the prepared data the benchmarks start from. The
+# setup is not measured.
+def setup(n_stations, n_days, seed=0):
+    stations_raw = synthetic_stations(n_stations, seed=seed)
+    prix_raw = synthetic_prix(stations_raw, n_days, seed=seed)
+
+    df_stations = prepare_stations(stations_raw)
+    df_prix = prepare_prix(prix_raw)
+    df_stations_carrefour, df_stations_others = split_carrefour(df_stations)
+    df_neighbours = find_neighbours(df_stations_carrefour, df_stations_others)
+
+    rng = np.random.default_rng(seed)
+    return {
+        "stations_raw": stations_raw,
+        "prix_raw": prix_raw,
+        "df_stations": df_stations,
+        "df_prix": df_prix,
+        "df_stations_carrefour": df_stations_carrefour,
+        "df_stations_others": df_stations_others,
+        "df_neighbours": df_neighbours,
+        "graph": CompetitorGraph.from_neighbours(
+            df_neighbours, df_stations_carrefour["ID"], 10.0
+        ),
+        "price_index": PriceIndex(df_prix),
+        "cube": build_price_cube(df_prix, df_stations),
+        "trends": fit_trends(df_prix),
+        "date": df_prix["Date"].max(),
+        "lookups": rng.choice(df_stations_carrefour["ID"].to_numpy(), N_LOOKUPS),
+    }
+
+
+# ------------------
+# --- BENCHMARKS ---
+# ------------------
+
+# One function per hot path of the pipeline and of the pages, taking the data
+# returned by setup
+
+
+# Enseignes normalization, filters and dtypes of the stations
+def bench_prepare_stations(data):
+    prepare_stations(data["stations_raw"])
+
+
+# Date parsing and outliers clipping of the prices
+def bench_prepare_prix(data):
+    prepare_prix(data["prix_raw"])
+
+
+def bench_clip_outliers(data):
+    clip_outliers(data["df_prix"], FUEL_COLUMNS)
+
+
+# Concurrents of every Carrefour station in a 10km radius
+def bench_competitor_graph(data):
+    CompetitorGraph.from_neighbours(
+        find_neighbours(data["df_stations_carrefour"], data["df_stations_others"]),
+        data["df_stations_carrefour"]["ID"],
+        10.0,
+    )
+
+
+# Gaps of every Carrefour station to its competitors, for every fuel and date
+def bench_price_gaps(data):
+    price_gaps(data["df_neighbours"], data["df_prix"])
+
+
+# Grid pyramid of the national heatmap, for every fuel and date
+def bench_price_grid(data):
+    build_price_grid(data["df_prix"], data["df_stations"])
+
+
+# Price changes of every station and fuel, then the competitor moves of more
+# than 2 cents of all the Carrefour stations on the last date
+def bench_price_moves(data):
+    competitor_moves(
+        price_moves(data["df_prix"]),
+        data["graph"].to_frame(),
+        data["date"],
+        min_delta=0.02,
+    )
+
+
+def bench_price_cube(data):
+    build_price_cube(data["df_prix"], data["df_stations"])
+
+
+# KPI page: enseigne x fuel table of a date, rendered as HTML
+def bench_kpi_page(data):
+    kpi_table_html(cube_table(data["cube"], data["date"]))
+
+
+# Map page: concurrents of a station, their rows and their prices of a date
+def bench_map_page(data):
+    df_stations_others = data["df_stations_others"]
+    for station_id in data["lookups"]:
+        ids, _ = data["graph"].neighbours_of(station_id)
+        df_stations_others[df_stations_others["ID"].isin(ids)]
+        data["price_index"].get_range([station_id, *ids], data["date"], data["date"])
+
+
+def bench_fit_trends(data):
+    fit_trends(data["df_prix"])
+
+
+# Backtest of every model at one origin, a week before the last date
+def bench_backtest_origin(data):
+    origin = data["date"] - pd.Timedelta(days=7)
+    backtest_origin(MODELS, data["df_prix"], origin)
+
+
+# AI model page: predicted prices of a station over the next 30 days
+def bench_ai_model_page(data):
+    dates = pd.date_range(data["date"], periods=30)
+    for station_id in data["lookups"]:
+        predict(data["trends"], station_id, "Gazole", dates)
+
+
+BENCHMARKS = {
+    "prepare_stations": bench_prepare_stations,
+    "prepare_prix": bench_prepare_prix,
+    "clip_outliers": bench_clip_outliers,
+    "competitor_graph": bench_competitor_graph,
+    "price_gaps": bench_price_gaps,
+    "price_grid": bench_price_grid,
+    "price_moves": bench_price_moves,
+    "price_cube": bench_price_cube,
+    "kpi_page": bench_kpi_page,
+    "map_page": bench_map_page,
+    "fit_trends": bench_fit_trends,
+    "backtest_origin": bench_backtest_origin,
+    "ai_model_page": bench_ai_model_page,
+}
+
+
+# ----------------
+# --- MEASURES ---
+# ----------------
+
+
+# Wall time of repeat runs (best and median), then the peak of the memory
+# allocated by one more run, measured apart since tracemalloc slows it down
+def measure(function, data, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "Best (s)": min(times),
+        "Median (s)": float(np.median(times)),
+        "Peak memory (MB)": peak / 1e6,
+    }
+
+
+# Run the benchmarks for every scale (number of stations x number of days)
+def run_benchmarks(stations, days, names=None, repeat=3, seed=0):
+    results = []
+    for n_stations in stations:
+        for n_days in days:
+            data = setup(n_stations, n_days, seed=seed)
+            for name in names or BENCHMARKS:
+                result = measure(BENCHMARKS[name], data, repeat=repeat)
+                results.append(
+                    {
+                        "Benchmark": name,
+                        "Stations": n_stations,
+                        "Days": n_days,
+                        "Price rows": len(data["df_prix"]),
+                        **result,
+                    }
+                )
+                print(
+                    f"{name} ({n_stations} stations, {n_days} days): "
+                    f"{result['Best (s)']:.3f}s, "
+                    f"{result['Peak memory (MB)']:.1f} MB"
+                )
+    return pd.DataFrame(results)
+
+
+# -----------
+# --- CLI ---
+# -----------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time and peak memory of the pipeline on synthetic data"
+    )
+    parser.add_argument(
+        "benchmarks", nargs="*", help=f"default: all ({', '.join(BENCHMARKS)})"
+    )
+    parser.add_argument("--stations", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--days", type=int, nargs="+", default=[14, 365])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", type=Path, help="append the results to this file")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    df_results = run_benchmarks(
+        args.stations, args.days, args.benchmarks, args.repeat, args.seed
+    )
+    print(df_results.to_string(index=False, float_format="{:.3f}".format))
+
+    if args.csv is not None:
+        df_results.assign(Run=pd.Timestamp.now().isoformat(timespec="seconds")).to_csv(
+            args.csv, mode="a", header=not args.csv.exists(), index=False
+        )
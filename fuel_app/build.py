@@ -0,0 +1,392 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from fuel_app.cube import build_price_cube
+from fuel_app.data import (
+    AGGREGATES_PATH,
+    CARREFOUR_PATH,
+    CONCURRENTS_GRAPH_PATH,
+    CONCURRENTS_PATH,
+    CONCURRENTS_RADIUS_KM,
+    DATA_DIR,
+    PRIX_PATH,
+    PRIX_STORE_PATH,
+    STATIONS_PATH,
+    STATIONS_STORE_PATH,
+    file_signature,
+    gaps_version,
+    grid_version,
+    prepare_prix,
+    prepare_stations,
+    signature_digest,
+    split_carrefour,
+    store_signature,
+)
+from fuel_app.extract import CHUNKSIZE, extract_prices
+from fuel_app.forecast import fit_trends
+from fuel_app.gaps import price_gaps
+from fuel_app.heatmap import build_price_grid
+from fuel_app.moves import last_prices, price_moves
+from fuel_app.neighbours import CompetitorGraph, build_index, find_neighbours
+from fuel_app.outliers import clip_outliers
+from fuel_app.schema import FUEL_COLUMNS
+from fuel_app.store import (
+    prix_dates,
+    read_prix,
+    write_aggregate,
+    write_prix,
+    write_stations,
+)
+
+# Yearly price file the 2 weeks extract is taken from
+RAW_PRIX_PATH = DATA_DIR / "origin" / "Prix_2024.csv"
+
+# Key of the inputs each stage was last built from
+MANIFEST_PATH = DATA_DIR / "store" / "build_manifest.json"
+
+# Number of station partitions of the trend fitting, per worker
+TREND_PARTITIONS_PER_WORKER = 4
+
+
+# ---------------------------
+# --- PARALLEL OPERATIONS ---
+# ---------------------------
+
+# The stages split their work into independent partitions, run in the
+# process pool of the build. Each function returns the same result as its
+# sequential version.
+
+
+def _run_all(pool, function, partitions):
+    futures = [pool.submit(function, *partition) for partition in partitions]
+    return [future.result() for future in futures]
+
+
+# Neighbours of the Carrefour stations, one task per chunk of them. The index
+# of the other stations is built once and sent with every task, so each task
+# only runs its queries (and neighbours across a department border are kept).
+def parallel_neighbours(
+    pool, df_stations_carrefour, df_stations_others, radius_km, n_partitions
+):
+    index = build_index(df_stations_others)
+    bounds = np.linspace(0, len(df_stations_carrefour), n_partitions + 1).astype(int)
+    partitions = [
+        (df_stations_carrefour.iloc[start:end], df_stations_others, radius_km, index)
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    return pd.concat(_run_all(pool, find_neighbours, partitions), ignore_index=True)
+
+
+# Outliers clipping with the signature of clip_outliers, one task per fuel
+# (the bounds of a fuel do not depend on the other fuels)
+def parallel_clip_outliers(pool, df_prix, fuels, method="quartiles", by=None):
+    if isinstance(by, str):
+        by = [by]
+    columns = by if isinstance(by, list) else []
+    partitions = [(df_prix[columns + [fuel]], [fuel], method, by) for fuel in fuels]
+    df_prix = df_prix.copy()
+    for fuel, df_fuel in zip(fuels, _run_all(pool, clip_outliers, partitions)):
+        df_prix[fuel] = df_fuel[fuel]
+    return df_prix
+
+
+# Trend coefficients, one task per partition of the stations (a station is
+# always fitted in a single task)
+def parallel_trends(pool, df_prix, n_partitions):
+    partitions = [
+        (df_part,) for _, df_part in df_prix.groupby(df_prix["ID"] % n_partitions)
+    ]
+    return pd.concat(_run_all(pool, fit_trends, partitions)).sort_index()
+
+
+# Price gaps, one task per partition of the dates (the gaps of a date only
+# depend on the prices of that date)
+def parallel_price_gaps(pool, df_edges, df_prix, n_partitions, radius_km=None):
+    days = df_prix["Date"].values.astype("datetime64[D]").astype("int64")
+    partitions = [
+        (df_edges, df_part, FUEL_COLUMNS, radius_km)
+        for _, df_part in df_prix.groupby(days % n_partitions)
+    ]
+    return pd.concat(_run_all(pool, price_gaps, partitions)).sort_index()
+
+
+# Price grid pyramid, one task per partition of the dates (the cells of a date
+# only depend on the prices of that date)
+def parallel_price_grid(pool, df_prix, df_stations, n_partitions):
+    days = df_prix["Date"].values.astype("datetime64[D]").astype("int64")
+    partitions = [
+        (df_part, df_stations) for _, df_part in df_prix.groupby(days % n_partitions)
+    ]
+    return pd.concat(_run_all(pool, build_price_grid, partitions)).sort_index()
+
+
+# --------------
+# --- STAGES ---
+# --------------
+
+# Each stage writes its outputs from its input files and the outputs of the
+# stages it depends on. It is run again only when the content of its inputs,
+# its parameters or one of its dependencies changed, or an output is missing.
+
+
+class Stage:
+    def __init__(self, name, run, inputs=(), deps=(), outputs=(), params=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.deps = list(deps)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+    # Hash of the inputs content, the parameters and the keys of the
+    # dependencies, computed once the dependencies are built
+    def key(self, dep_keys):
+        content = {
+            "inputs": [
+                file_signature(path)[3] if Path(path).exists() else None
+                for path in self.inputs
+            ],
+            "params": self.params,
+            "deps": [dep_keys.get(dep) for dep in self.deps],
+        }
+        return hashlib.sha256(json.dumps(content, default=str).encode()).hexdigest()
+
+    def is_built(self):
+        return all(Path(path).exists() for path in self.outputs)
+
+
+def build_extract(pool, args):
+    df_prix = extract_prices(
+        args.source, window=pd.Timedelta(days=args.days), chunksize=CHUNKSIZE
+    )
+    df_prix.to_csv(PRIX_PATH, index=False)
+
+
+def build_stations(pool, args):
+    df_stations = prepare_stations(pd.read_csv(STATIONS_PATH))
+    df_stations[df_stations["Enseignes"] == "carrefour"].to_csv(CARREFOUR_PATH)
+    df_stations[df_stations["Enseignes"] != "carrefour"].to_csv(CONCURRENTS_PATH)
+    STATIONS_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_stations(df_stations, STATIONS_STORE_PATH)
+
+
+def build_graph(pool, args):
+    df_stations = prepare_stations(pd.read_csv(STATIONS_PATH))
+    df_stations_carrefour, df_stations_others = split_carrefour(df_stations)
+    CompetitorGraph.from_neighbours(
+        parallel_neighbours(
+            pool,
+            df_stations_carrefour,
+            df_stations_others,
+            args.radius_km,
+            args.workers,
+        ),
+        df_stations_carrefour["ID"],
+        args.radius_km,
+        source=file_signature(STATIONS_PATH)[3],
+    ).save(CONCURRENTS_GRAPH_PATH)
+
+
+# Only the dates of the extract are written: the days fuel_app.ingest added to
+# the store are kept. When the store already goes past the extract, the days of
+# the extract older than the store left its window and are not written back.
+def build_prix_store(pool, args):
+    df_prix = prepare_prix(
+        pd.read_csv(PRIX_PATH), clip=functools.partial(parallel_clip_outliers, pool)
+    )
+    store_dates = prix_dates(PRIX_STORE_PATH)
+    if store_dates and store_dates[-1] > df_prix["Date"].max():
+        df_prix = df_prix[df_prix["Date"] >= store_dates[0]]
+    write_prix(df_prix, PRIX_STORE_PATH)
+
+
+# Price cube, trends and price moves (with the last known prices ingestion
+# continues from), saved with the version of the store so that the app reads
+# them instead of computing them
+def build_aggregates(pool, args):
+    df_prix = read_prix(PRIX_STORE_PATH)
+    df_stations = prepare_stations(pd.read_csv(STATIONS_PATH))
+    trends = parallel_trends(pool, df_prix, TREND_PARTITIONS_PER_WORKER * args.workers)
+    cube = build_price_cube(df_prix, df_stations)
+
+    version = signature_digest(store_signature(PRIX_STORE_PATH))
+    write_aggregate(cube, AGGREGATES_PATH, "cube", version)
+    write_aggregate(trends, AGGREGATES_PATH, "trends", version)
+    write_aggregate(price_moves(df_prix), AGGREGATES_PATH, "moves", version)
+    write_aggregate(last_prices(df_prix), AGGREGATES_PATH, "last_prices", version)
+
+
+# Price gaps of the Carrefour stations to their competitors, saved with the
+# version of the store, the stations and the radius the app reads them with
+def build_gaps(pool, args):
+    df_gaps = parallel_price_gaps(
+        pool,
+        CompetitorGraph.load(CONCURRENTS_GRAPH_PATH).to_frame(),
+        read_prix(PRIX_STORE_PATH),
+        args.workers,
+        args.radius_km,
+    )
+    version = gaps_version(
+        store_signature(PRIX_STORE_PATH),
+        file_signature(STATIONS_PATH),
+        args.radius_km,
+    )
+    write_aggregate(df_gaps, AGGREGATES_PATH, "gaps", version)
+
+
+# Price grid pyramid of the national heatmap, saved with the version of the
+# store and the stations
+def build_grid(pool, args):
+    df_grid = parallel_price_grid(
+        pool,
+        read_prix(PRIX_STORE_PATH),
+        prepare_stations(pd.read_csv(STATIONS_PATH)),
+        args.workers,
+    )
+    version = grid_version(
+        store_signature(PRIX_STORE_PATH), file_signature(STATIONS_PATH)
+    )
+    write_aggregate(df_grid, AGGREGATES_PATH, "grid", version)
+
+
+def build_stages(args):
+    return [
+        Stage(
+            "extract",
+            build_extract,
+            inputs=[args.source],
+            outputs=[PRIX_PATH],
+            params={"days": args.days},
+        ),
+        Stage(
+            "stations",
+            build_stations,
+            inputs=[STATIONS_PATH],
+            outputs=[CARREFOUR_PATH, CONCURRENTS_PATH, STATIONS_STORE_PATH],
+        ),
+        Stage(
+            "graph",
+            build_graph,
+            inputs=[STATIONS_PATH],
+            outputs=[CONCURRENTS_GRAPH_PATH / "ids.npy"],
+            params={"radius_km": args.radius_km},
+        ),
+        Stage(
+            "prix_store",
+            build_prix_store,
+            inputs=[PRIX_PATH],
+            deps=["extract"],
+            outputs=[PRIX_STORE_PATH],
+        ),
+        Stage(
+            "aggregates",
+            build_aggregates,
+            inputs=[STATIONS_PATH],
+            deps=["prix_store"],
+            outputs=[
+                AGGREGATES_PATH / "cube.parquet",
+                AGGREGATES_PATH / "trends.parquet",
+                AGGREGATES_PATH / "moves.parquet",
+                AGGREGATES_PATH / "last_prices.parquet",
+            ],
+        ),
+        Stage(
+            "gaps",
+            build_gaps,
+            inputs=[STATIONS_PATH],
+            deps=["prix_store", "graph"],
+            outputs=[AGGREGATES_PATH / "gaps.parquet"],
+            params={"radius_km": args.radius_km},
+        ),
+        Stage(
+            "grid",
+            build_grid,
+            inputs=[STATIONS_PATH],
+            deps=["prix_store"],
+            outputs=[AGGREGATES_PATH / "grid.parquet"],
+        ),
+    ]
+
+
+# -------------
+# --- BUILD ---
+# -------------
+
+
+def _read_manifest():
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text())
+    return {}
+
+
+def _write_manifest(manifest):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+
+
+# Run the stages in dependency order (the stages are listed after their
+# dependencies), skipping the up to date ones. The stages share one process
+# pool of args.workers processes. The extract stage is skipped when the
+# yearly price file is not available, the existing extract is then used.
+def run_build(args, names=None):
+    stages = build_stages(args)
+    selected = set(names or [stage.name for stage in stages])
+    manifest = _read_manifest()
+    keys = {}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for stage in stages:
+            if stage.name == "extract" and not Path(args.source).exists():
+                print(f"{stage.name}: skipped, {args.source} not found")
+                continue
+
+            keys[stage.name] = stage.key(keys)
+            if stage.name not in selected:
+                continue
+            up_to_date = manifest.get(stage.name) == keys[stage.name]
+            if up_to_date and stage.is_built() and not args.force:
+                print(f"{stage.name}: up to date")
+                continue
+
+            start = time.perf_counter()
+            stage.run(pool, args)
+            manifest[stage.name] = keys[stage.name]
+            _write_manifest(manifest)
+            print(f"{stage.name}: built in {time.perf_counter() - start:.1f}s")
+
+    return manifest
+
+
+# -----------
+# --- CLI ---
+# -----------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the derived data files whose inputs changed"
+    )
+    parser.add_argument(
+        "stages",
+        nargs="*",
+        help="stages to build (default: all): extract, stations, graph, "
+        "prix_store, aggregates, gaps, grid",
+    )
+    parser.add_argument("--force", action="store_true", help="rebuild all stages")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--source", type=Path, default=RAW_PRIX_PATH)
+    parser.add_argument("--days", type=int, default=14, help="extract window")
+    parser.add_argument("--radius-km", type=float, default=CONCURRENTS_RADIUS_KM)
+    args = parser.parse_args()
+
+    run_build(args, args.stages)
@@ -0,0 +1,42 @@
+# -------------------------
+# --- STATION CATALOGUE ---
+# -------------------------
+
+
+# Selectbox labels of a set of stations, built once with vectorized string
+# concatenation, with dict based label -> ID and ID -> position lookups
+class StationCatalogue:
+    def __init__(self, df_stations, sort_by=None):
+        if sort_by is not None:
+            df_stations = df_stations.sort_values(by=sort_by)
+        self.df_stations = df_stations.reset_index(drop=True)
+
+        self.ids = self.df_stations["ID"].tolist()
+        self.labels = (
+            self.df_stations["Adresse"].astype(str)
+            + ", "
+            + self.df_stations["Ville"].astype(str)
+            + " (ID: "
+            + self.df_stations["ID"].astype(str)
+            + ")"
+        ).tolist()
+
+        self.id_by_label = dict(zip(self.labels, self.ids))
+        self.position_by_id = {id: position for position, id in enumerate(self.ids)}
+
+    # Position of a station in the selectbox options (0 for unknown stations)
+    def index_of(self, station_id):
+        return self.position_by_id.get(station_id, 0)
+
+    def id_of(self, label):
+        return self.id_by_label[label]
+
+    def label_of(self, station_id):
+        return self.labels[self.index_of(station_id)]
+
+    # Row of a station, as a pd.Series
+    def row_of(self, station_id):
+        return self.df_stations.iloc[self.index_of(station_id)]
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,183 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Points kept per series: about the width of a chart in pixels, more points
+# are not visible
+MAX_POINTS = 1000
+
+# Above this number of points, the figure is drawn with WebGL (Scattergl)
+# instead of SVG
+WEBGL_THRESHOLD = 5000
+
+# Markers are only drawn on series up to this length (2 weeks look unchanged)
+MAX_POINTS_WITH_MARKERS = 60
+
+
+# --------------------
+# --- DOWNSAMPLING ---
+# --------------------
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+# Largest-Triangle-Three-Buckets: positions of n_out points of the (x, y)
+# series (sorted by x) keeping its visual shape. The first and last points are
+# kept, and one point per bucket in between: the one forming the largest
+# triangle with the point kept in the previous bucket and the mean of the next
+# bucket.
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    kept = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[kept] - next_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (next_y - y[kept])
+        )
+        kept = start + int(np.argmax(areas))
+        indices[bucket + 1] = kept
+    return indices
+
+
+# Min / max bucketing: positions of the lowest and highest point of each of
+# n_out // 2 buckets, in one grouped operation
+def minmax_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    buckets = np.arange(n) * (n_out // 2) // n
+    grouped = pd.Series(_as_float(y)).groupby(buckets)
+    return np.union1d(grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy())
+
+
+DOWNSAMPLERS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+
+# Rows of df kept to draw the y over x line of each series (group of by), at
+# most max_points per series. Missing values are dropped.
+def downsample(df, x, y, by=None, max_points=MAX_POINTS, method="lttb"):
+    indices_function = DOWNSAMPLERS[method]
+    df = df.dropna(subset=[y]).sort_values(by=x, kind="stable")
+    groups = [df] if by is None else [group for _, group in df.groupby(by)]
+
+    parts = []
+    for group in groups:
+        positions = indices_function(
+            group[x].to_numpy(), group[y].to_numpy(), max_points
+        )
+        parts.append(group.iloc[positions])
+    return pd.concat(parts) if parts else df
+
+
+# --------------
+# --- CHARTS ---
+# --------------
+
+
+# Line chart of y over x (one line per line_group, colored by color), drawn
+# from at most max_points per line. Prices equal to 0 (fuel not sold) are not
+# drawn. Large figures switch to WebGL.
+def line_chart(
+    df,
+    x,
+    y,
+    color=None,
+    line_group=None,
+    max_points=MAX_POINTS,
+    method="lttb",
+    webgl_threshold=WEBGL_THRESHOLD,
+    **px_kwargs,
+):
+    df = df.assign(**{y: df[y].where(df[y] != 0)})
+    by = [col for col in [color, line_group] if col is not None] or None
+    df = downsample(df, x, y, by=by, max_points=max_points, method=method)
+
+    series_length = df.groupby(by, observed=True).size().max() if by else len(df)
+    return px.line(
+        df,
+        x=x,
+        y=y,
+        color=color,
+        line_group=line_group,
+        markers=bool(series_length <= MAX_POINTS_WITH_MARKERS),
+        render_mode="webgl" if len(df) > webgl_threshold else "svg",
+        **px_kwargs,
+    )
+
+
+# Mean and spread (mean +/- standard deviation) of y over x for each brand,
+# computed over the stations of the brand. Prices equal to 0 are left out.
+def brand_bands(df, x, y, brand):
+    df = df[df[y] > 0]
+    df_bands = (
+        df.groupby([brand, x], observed=True)[y]
+        .agg(Mean="mean", Spread="std")
+        .reset_index()
+    )
+    df_bands["Spread"] = df_bands["Spread"].fillna(0.0)
+    df_bands["Lower"] = df_bands["Mean"] - df_bands["Spread"]
+    df_bands["Upper"] = df_bands["Mean"] + df_bands["Spread"]
+    return df_bands
+
+
+# Add one band per brand to fig: the mean line and a filled area between the
+# lower and upper bounds, downsampled like line_chart
+def add_brand_bands(
+    fig, df_bands, x, brand, max_points=MAX_POINTS, webgl_threshold=WEBGL_THRESHOLD
+):
+    colors = px.colors.qualitative.Plotly
+    scatter = go.Scattergl if len(df_bands) > webgl_threshold else go.Scatter
+    for number, (name, df_band) in enumerate(df_bands.groupby(brand, observed=True)):
+        df_band = downsample(df_band, x, "Mean", max_points=max_points)
+        color = colors[number % len(colors)]
+        band_x = np.concatenate([df_band[x].to_numpy(), df_band[x].to_numpy()[::-1]])
+        band_y = np.concatenate(
+            [df_band["Upper"].to_numpy(), df_band["Lower"].to_numpy()[::-1]]
+        )
+        fig.add_trace(
+            scatter(
+                x=band_x,
+                y=band_y,
+                fill="toself",
+                fillcolor=color,
+                opacity=0.2,
+                line=dict(width=0),
+                hoverinfo="skip",
+                legendgroup=str(name),
+                showlegend=False,
+            )
+        )
+        fig.add_trace(
+            scatter(
+                x=df_band[x],
+                y=df_band["Mean"],
+                mode="lines",
+                line=dict(color=color),
+                name=f"{name} (mean)",
+                legendgroup=str(name),
+            )
+        )
+    return fig
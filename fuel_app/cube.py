@@ -0,0 +1,83 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+CUBE_INDEX = ["Date", "Enseignes", "Fuel"]
+
+
+# ------------------
+# --- PRICE CUBE ---
+# ------------------
+
+# The cube holds, for each (date, enseigne, fuel), the sum / count / min / max
+# of the non-zero prices, and the mean derived from them. Sums and counts are
+# kept so that the cube can be updated with new rows without rescanning the
+# whole price history.
+
+
+def build_price_cube(df_prix, df_stations):
+    df_enseignes = df_stations[["ID", "Enseignes"]].assign(
+        ID=df_stations["ID"].astype(int)
+    )
+    df = df_prix[["ID", "Date", *FUEL_COLUMNS]].merge(df_enseignes, on="ID")
+
+    # A price of 0 means the fuel is not sold by the station
+    df[FUEL_COLUMNS] = df[FUEL_COLUMNS].astype(float).replace(0, np.nan)
+
+    cube = df.groupby(["Date", "Enseignes"], observed=True)[FUEL_COLUMNS].agg(
+        ["sum", "count", "min", "max"]
+    )
+    cube.columns = cube.columns.set_names(["Fuel", None])
+    cube = cube.stack(level="Fuel", future_stack=True)
+    cube.columns = ["Sum", "Count", "Min", "Max"]
+    cube = cube[cube["Count"] > 0]
+    return _with_mean(cube)
+
+
+# Merge the cube of new price rows into an existing cube
+def update_price_cube(cube, df_prix_new, df_stations):
+    new_cube = build_price_cube(df_prix_new, df_stations)
+    both = cube.index.intersection(new_cube.index)
+
+    merged = pd.concat([cube.drop(index=both), new_cube.drop(index=both)])
+    if len(both) > 0:
+        old, new = cube.loc[both], new_cube.loc[both]
+        merged_both = pd.DataFrame(
+            {
+                "Sum": old["Sum"] + new["Sum"],
+                "Count": old["Count"] + new["Count"],
+                "Min": np.minimum(old["Min"], new["Min"]),
+                "Max": np.maximum(old["Max"], new["Max"]),
+            }
+        )
+        merged = pd.concat([merged, merged_both])
+    return _with_mean(merged)
+
+
+def _with_mean(cube):
+    cube = cube[["Sum", "Count", "Min", "Max"]].copy()
+    cube["Mean"] = cube["Sum"] / cube["Count"]
+    cube.index = cube.index.set_names(CUBE_INDEX)
+    return cube.sort_index()
+
+
+# --------------
+# --- LOOKUP ---
+# --------------
+
+
+# Enseigne x fuel table of a statistic for one date. Enseignes or fuels
+# without any price that day are NaN. The cube index is sorted, so the date
+# lookup is a binary search rather than a scan of the price rows.
+def cube_table(cube, date, stat="Mean", enseignes=None, fuels=FUEL_COLUMNS):
+    try:
+        table = cube.xs(pd.Timestamp(date), level="Date")[stat].unstack("Fuel")
+    except KeyError:
+        table = pd.DataFrame(dtype=float)
+    if enseignes is None:
+        enseignes = table.index
+    return table.reindex(index=enseignes, columns=fuels)
@@ -0,0 +1,512 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import functools
+import hashlib
+from pathlib import Path
+import streamlit as st
+import pandas as pd
+from fuel_app.catalogue import StationCatalogue
+from fuel_app.cube import build_price_cube
+from fuel_app.enseignes import canonicalize_enseignes
+from fuel_app.forecast import fit_trends
+from fuel_app.gaps import price_gaps
+from fuel_app.heatmap import build_price_grid
+from fuel_app.moves import price_moves
+from fuel_app.instrument import timed
+from fuel_app.neighbours import CompetitorGraph, build_index, find_neighbours
+from fuel_app.outliers import clip_outliers
+from fuel_app.prices import PriceIndex
+from fuel_app.registry import Datasets, frame_view
+from fuel_app.schema import (
+    FUEL_COLUMNS,
+    apply_prix_schema,
+    apply_stations_schema,
+    to_timestamp,
+)
+from fuel_app.store import prix_dates, read_aggregate, read_prix, store_generation
+
+# -------------
+# --- PATHS ---
+# -------------
+
+DATA_DIR = Path.cwd() / "data"
+STATIONS_PATH = DATA_DIR / "origin" / "Infos_Stations.csv"
+PRIX_PATH = DATA_DIR / "processed" / "Prix_2_weeks.csv"
+CARREFOUR_PATH = DATA_DIR / "processed" / "Carrefour.csv"
+CONCURRENTS_PATH = DATA_DIR / "processed" / "Concurrents.csv"
+CONCURRENTS_GRAPH_PATH = DATA_DIR / "processed" / "concurrents_graph"
+
+# Parquet store of the prepared data, see fuel_app.store
+PRIX_STORE_PATH = DATA_DIR / "store" / "prix"
+STATIONS_STORE_PATH = DATA_DIR / "store" / "stations.parquet"
+AGGREGATES_PATH = DATA_DIR / "store" / "aggregates"
+
+# Radius (in km) used to find the concurrents of each Carrefour station
+CONCURRENTS_RADIUS_KM = 10
+
+# Results of price store queries kept in cache (see query_prix)
+QUERY_CACHE_ENTRIES = 256
+
+
+# ------------------
+# --- CACHE KEYS ---
+# ------------------
+
+
+# The content hash is only recomputed when the file mtime or size changes
+@functools.lru_cache(maxsize=32)
+def _content_hash(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Signature of a Parquet store: its generation (renewed on each write, see
+# fuel_app.store), or for stores written without it, the files it contains
+# with their mtime and size
+def store_signature(root):
+    generation = store_generation(root)
+    if generation is not None:
+        return (generation,)
+    return tuple(
+        (str(path.relative_to(root)), path.stat().st_mtime_ns, path.stat().st_size)
+        for path in sorted(Path(root).rglob("*.parquet"))
+    )
+
+
+# Short digest of a signature, used to version the persisted aggregates
+def signature_digest(signature):
+    return hashlib.sha256(repr(signature).encode()).hexdigest()
+
+
+# Version of the price gaps: they depend on the prices, the stations and the
+# radius of the competitor graph
+def gaps_version(prix_signature, stations_signature, radius_km):
+    return signature_digest(
+        (signature_digest(prix_signature), stations_signature[3], float(radius_km))
+    )
+
+
+# Version of the price grid: it depends on the prices and the coordinates of
+# the stations
+def grid_version(prix_signature, stations_signature):
+    return signature_digest((signature_digest(prix_signature), stations_signature[3]))
+
+
+# Source of the prepared prices: the Parquet store when it exists (it is kept
+# up to date by fuel_app.ingest), otherwise the extracted CSV
+def prix_source(path=None):
+    if path is None:
+        path = PRIX_STORE_PATH if PRIX_STORE_PATH.is_dir() else PRIX_PATH
+    if Path(path).is_dir():
+        return str(path), store_signature(path)
+    return str(path), file_signature(path)
+
+
+# Signature of a source file, used as cache key by the loaders below
+def file_signature(path):
+    stat = Path(path).stat()
+    return (
+        str(path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        _content_hash(str(path), stat.st_mtime_ns, stat.st_size),
+    )
+
+
+# ------------------------
+# --- DATA PREPARATION ---
+# ------------------------
+
+
+@timed("prepare stations")
+def prepare_stations(df_stations, enseignes_mapping=None):
+    # Remove NaN values
+    df_stations = df_stations.dropna()
+
+    # --- Fix "Enseignes" column ---
+
+    # Lower case, normalize and regroup names referring to the same enseigne,
+    # resolving each distinct raw name once
+    df_stations["Enseignes"] = canonicalize_enseignes(
+        df_stations["Enseignes"], mapping=enseignes_mapping
+    )
+
+    # Order alphabetically by enseignes
+    df_stations = df_stations.sort_values(by="Enseignes")
+
+    # Exclude rows with enseignes to be excluded
+    df_stations = df_stations[df_stations["Enseignes"] != "excluded"]
+
+    # Keep only road stations
+    df_stations = df_stations[df_stations["Type"] == "R"]
+
+    # We keep only the "enseignes" having more than 100 stations
+    enseignes = df_stations["Enseignes"].value_counts()
+    enseignes = enseignes[enseignes > 100].index.tolist()
+
+    df_stations = df_stations[df_stations["Enseignes"].isin(enseignes)]
+    df_stations = df_stations.assign(
+        Enseignes=df_stations["Enseignes"].cat.remove_unused_categories()
+    )
+    return apply_stations_schema(df_stations)
+
+
+# clip is the outliers clipping function, with the signature of clip_outliers
+@timed("prepare prices")
+def prepare_prix(
+    df_prix, outliers_method="quartiles", outliers_by=None, clip=clip_outliers
+):
+    # Remove NaN values
+    df_prix = df_prix.rename(columns={"id": "ID"}).dropna()
+
+    # Convert date column to datetime
+    df_prix["Date"] = pd.to_datetime(df_prix["Date"], format="%Y-%m-%d")
+
+    # Replace outliers, by default with the Q1 and Q3 of each fuel
+    df_prix = clip(df_prix, FUEL_COLUMNS, method=outliers_method, by=outliers_by)
+    return apply_prix_schema(df_prix)
+
+
+# Split stations between Carrefour and concurrents, with coordinates converted
+# to degrees
+@timed("split Carrefour stations")
+def split_carrefour(df_stations):
+    df_stations_carrefour = df_stations[df_stations["Enseignes"] == "carrefour"].copy()
+    df_stations_others = df_stations[df_stations["Enseignes"] != "carrefour"].copy()
+
+    for df in (df_stations_carrefour, df_stations_others):
+        df["Latitude"] = df["Latitude"].apply(float) / 100000
+        df["Longitude"] = df["Longitude"].apply(float) / 100000
+
+    return df_stations_carrefour, df_stations_others
+
+
+# ---------------
+# --- LOADERS ---
+# ---------------
+
+# The cached functions take the file signature as argument, so that any change
+# of the source file (mtime or content) invalidates the cached result.
+# The prepared frames are cached as resources: every session gets the same
+# object (cache_data would deserialize a new copy on each call), handed out as
+# a view by the public loaders.
+
+
+def _read_csv(path, stage_name):
+    with timed(stage_name) as stage:
+        df = pd.read_csv(path)
+        stage.rows = len(df)
+    return df
+
+
+@st.cache_resource(show_spinner=False)
+def _load_stations(path, signature):
+    return prepare_stations(_read_csv(path, "read stations CSV"))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_prix(path, signature):
+    if Path(path).is_dir():
+        return timed("read price store")(read_prix)(path)
+    return prepare_prix(_read_csv(path, "read prices CSV"))
+
+
+# First and last dates of the prices: the names of the partitions of the
+# store, without reading it
+@st.cache_resource(show_spinner=False)
+def _load_date_bounds(path, signature):
+    if Path(path).is_dir():
+        dates = prix_dates(path)
+        return dates[0], dates[-1]
+    df_prix = _load_prix(path, signature)
+    return df_prix["Date"].min(), df_prix["Date"].max()
+
+
+# Prices of the stations ids (in the order of ids, then by date) between
+# start and end, read from the store with the filters pushed down to the scan
+@st.cache_data(show_spinner=False, max_entries=QUERY_CACHE_ENTRIES)
+@timed("price store query")
+def _query_prix_store(path, signature, ids, start, end):
+    df_prix = read_prix(path, ids=ids, start=start, end=end)
+    if ids is not None:
+        rank = {id: position for position, id in enumerate(ids)}
+        df_prix = df_prix.sort_values(
+            by="ID", key=lambda col: col.map(rank), kind="stable", ignore_index=True
+        )
+    return df_prix
+
+
+@st.cache_resource(show_spinner=False)
+def _load_carrefour_split(path, signature):
+    return split_carrefour(_load_stations(path, signature))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_concurrents_index(path, signature):
+    _, df_stations_others = _load_carrefour_split(path, signature)
+    return build_index(df_stations_others)
+
+
+@st.cache_data(show_spinner=False)
+def _load_concurrents(path, signature, radius_km):
+    df_stations_carrefour, df_stations_others = _load_carrefour_split(path, signature)
+    df_concurrents = find_neighbours(
+        df_stations_carrefour,
+        df_stations_others,
+        radius_km=radius_km,
+        index=_load_concurrents_index(path, signature),
+    )
+    return df_concurrents
+
+
+# The graph saved by fuel_app.build is memory-mapped when it was built from
+# the same stations file with a large enough radius, otherwise it is rebuilt
+@st.cache_resource(show_spinner=False)
+@timed("competitor graph")
+def _load_competitor_graph(path, signature, radius_km, graph_path):
+    if (Path(graph_path) / "source.npy").exists():
+        graph = CompetitorGraph.load(graph_path)
+        if graph.source == signature[3] and graph.radius_km >= radius_km:
+            return graph
+
+    df_stations_carrefour, _ = _load_carrefour_split(path, signature)
+    return CompetitorGraph.from_neighbours(
+        _load_concurrents(path, signature, radius_km),
+        df_stations_carrefour["ID"],
+        radius_km,
+        source=signature[3],
+    )
+
+
+# The price cube and the trends saved by fuel_app.ingest are reused when they
+# were computed from the same version of the prices
+
+
+@st.cache_resource(show_spinner=False)
+@timed("price cube")
+def _load_price_cube(prix_path, prix_signature, stations_path, stations_signature):
+    cube = read_aggregate(AGGREGATES_PATH, "cube", signature_digest(prix_signature))
+    if cube is not None:
+        return cube
+    return build_price_cube(
+        _load_prix(prix_path, prix_signature),
+        _load_stations(stations_path, stations_signature),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+@timed("price index")
+def _load_price_index(path, signature):
+    return PriceIndex(_load_prix(path, signature))
+
+
+@st.cache_resource(show_spinner=False)
+@timed("trends")
+def _load_trends(path, signature):
+    trends = read_aggregate(AGGREGATES_PATH, "trends", signature_digest(signature))
+    if trends is not None:
+        return trends
+    return fit_trends(_load_prix(path, signature))
+
+
+@st.cache_resource(show_spinner=False)
+@timed("price gaps")
+def _load_price_gaps(
+    prix_path, prix_signature, stations_path, stations_signature, radius_km
+):
+    version = gaps_version(prix_signature, stations_signature, radius_km)
+    gaps = read_aggregate(AGGREGATES_PATH, "gaps", version)
+    if gaps is not None:
+        return gaps
+    graph = load_competitor_graph(stations_path, radius_km)
+    return price_gaps(
+        graph.to_frame(), _load_prix(prix_path, prix_signature), radius_km=radius_km
+    )
+
+
+@st.cache_resource(show_spinner=False)
+@timed("price grid")
+def _load_price_grid(prix_path, prix_signature, stations_path, stations_signature):
+    grid = read_aggregate(
+        AGGREGATES_PATH, "grid", grid_version(prix_signature, stations_signature)
+    )
+    if grid is not None:
+        return grid
+    return build_price_grid(
+        _load_prix(prix_path, prix_signature),
+        _load_stations(stations_path, stations_signature),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+@timed("price moves")
+def _load_price_moves(path, signature):
+    moves = read_aggregate(AGGREGATES_PATH, "moves", signature_digest(signature))
+    if moves is not None:
+        return moves
+    return price_moves(_load_prix(path, signature))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_backtest(prix_signature, version_signature):
+    return read_aggregate(AGGREGATES_PATH, "backtest", signature_digest(prix_signature))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_station_catalogue(path, signature, carrefour_only):
+    if carrefour_only:
+        df_stations_carrefour, _ = _load_carrefour_split(path, signature)
+        return StationCatalogue(df_stations_carrefour, sort_by="Ville")
+    return StationCatalogue(_load_stations(path, signature))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_datasets(stations_path, stations_signature, prix_path, prix_signature):
+    return Datasets(
+        functools.partial(_load_stations, stations_path, stations_signature),
+        functools.partial(_load_prix, prix_path, prix_signature),
+        functools.partial(_load_date_bounds, prix_path, prix_signature),
+        functools.partial(_load_carrefour_split, stations_path, stations_signature),
+        functools.partial(load_competitor_graph, stations_path),
+    )
+
+
+def load_stations(path=STATIONS_PATH):
+    return frame_view(_load_stations(str(path), file_signature(path)))
+
+
+def load_prix(path=None):
+    return frame_view(_load_prix(*prix_source(path)))
+
+
+# Registry of the prepared frames, shared by all the pages and sessions and
+# loaded lazily, see fuel_app.registry
+def load_datasets(stations_path=STATIONS_PATH, prix_path=None):
+    return _load_datasets(
+        str(stations_path), file_signature(stations_path), *prix_source(prix_path)
+    )
+
+
+# Prices indexed by (ID, Date), shared by all sessions. It must not be modified.
+def load_price_index(path=None):
+    return _load_price_index(*prix_source(path))
+
+
+# Linear trend coefficients of every (station, fuel), see fuel_app.forecast
+def load_trends(path=None):
+    return frame_view(_load_trends(*prix_source(path)))
+
+
+# Price gaps of every Carrefour station to its competitors, for every fuel and
+# date, indexed by (ID, Date, Fuel), see fuel_app.gaps
+def load_price_gaps(
+    prix_path=None, stations_path=STATIONS_PATH, radius_km=CONCURRENTS_RADIUS_KM
+):
+    return frame_view(
+        _load_price_gaps(
+            *prix_source(prix_path),
+            str(stations_path),
+            file_signature(stations_path),
+            radius_km,
+        )
+    )
+
+
+def load_price_cube(prix_path=None, stations_path=STATIONS_PATH):
+    return frame_view(
+        _load_price_cube(
+            *prix_source(prix_path), str(stations_path), file_signature(stations_path)
+        )
+    )
+
+
+# Mean price of the stations of each cell of a grid pyramid, for every level,
+# date and fuel, indexed by (Level, Date, Fuel, Cell_y, Cell_x), see
+# fuel_app.heatmap
+def load_price_grid(prix_path=None, stations_path=STATIONS_PATH):
+    return frame_view(
+        _load_price_grid(
+            *prix_source(prix_path), str(stations_path), file_signature(stations_path)
+        )
+    )
+
+
+# Price changes of every station and fuel, indexed by (Date, ID, Fuel), see
+# fuel_app.moves
+def load_price_moves(path=None):
+    return frame_view(_load_price_moves(*prix_source(path)))
+
+
+# Error sums of the rolling origin backtest of the price models, indexed by
+# (Model, ID, Fuel, Horizon), see fuel_app.backtest. None when the backtest was
+# not run on the current prices (it is too long to run in the app).
+def load_backtest(prix_path=None):
+    version_path = AGGREGATES_PATH / "backtest.version"
+    if not version_path.exists():
+        return None
+    _, prix_signature = prix_source(prix_path)
+    df_sums = _load_backtest(prix_signature, file_signature(version_path))
+    return None if df_sums is None else frame_view(df_sums)
+
+
+# Selectbox options of the stations (only the Carrefour ones, sorted by city,
+# when carrefour_only), shared by all pages and sessions
+def load_station_catalogue(carrefour_only=False, path=STATIONS_PATH):
+    return _load_station_catalogue(str(path), file_signature(path), carrefour_only)
+
+
+def load_carrefour_split(path=STATIONS_PATH):
+    df_stations_carrefour, df_stations_others = _load_carrefour_split(
+        str(path), file_signature(path)
+    )
+    return frame_view(df_stations_carrefour), frame_view(df_stations_others)
+
+
+def load_concurrents(path=STATIONS_PATH, radius_km=CONCURRENTS_RADIUS_KM):
+    return _load_concurrents(str(path), file_signature(path), radius_km)
+
+
+# Competitor graph shared by all sessions. It must not be modified.
+def load_competitor_graph(
+    path=STATIONS_PATH,
+    radius_km=CONCURRENTS_RADIUS_KM,
+    graph_path=CONCURRENTS_GRAPH_PATH,
+):
+    return _load_competitor_graph(
+        str(path), file_signature(path), radius_km, str(graph_path)
+    )
+
+
+# Prices of some stations over a date range (both bounds included), ordered by
+# station (in the order of ids) then date. From the Parquet store, the filters
+# are pushed down to the scan, so only the requested stations and dates are
+# read whatever the length of the history; the results are cached by filters
+# and version of the store. Prices from the CSV extract are looked up in
+# memory: the (ID, Date) price index for station IDs, otherwise a date filter
+# of the whole frame.
+def query_prix(ids=None, start=None, end=None):
+    path, signature = prix_source()
+    if Path(path).is_dir():
+        return _query_prix_store(
+            path,
+            signature,
+            None if ids is None else tuple(int(id) for id in ids),
+            to_timestamp(start),
+            to_timestamp(end),
+        )
+
+    if ids is not None:
+        return load_price_index().get_range(ids, start, end)
+
+    df_prix = load_prix()
+    mask = pd.Series(True, index=df_prix.index)
+    if start is not None:
+        mask &= df_prix["Date"] >= to_timestamp(start)
+    if end is not None:
+        mask &= df_prix["Date"] <= to_timestamp(end)
+    return df_prix[mask]
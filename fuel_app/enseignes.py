@@ -0,0 +1,103 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import re
+import unicodedata
+import pandas as pd
+
+# -------------
+# --- RULES ---
+# -------------
+
+# Names referring to the same enseigne are regrouped with a first-match rule
+# table: each raw name is resolved by the first pattern it matches
+operationsList = [
+    [r".*carrefour.*", "carrefour"],
+    [r".*casino.*", "casino"],
+    [r".*geant.*", "casino"],
+    [r".*leclerc.*", "leclerc"],
+    [r".*8.*", "8 a huit"],
+    [r".*aire-c*", "airec"],
+    [r".*aire c*", "airec"],
+    [r".*esso.*", "esso"],
+    [r".*g20.*", "g20"],
+    [r".* u.*", "systeme u"],
+    [r".*u .*", "systeme u"],
+    [r".*total .*", "totalenergies"],
+    [r".*spar.*", "spar"],
+    [r".*simply.*", "simply"],
+    [r".*intermarche.*", "intermarche"],
+    # excluded
+    [r".*indapendant.*", "excluded"],
+    [r".*independant.*", "excluded"],
+    [r".*inconnu.*", "excluded"],
+    [r".*pas de marque.*", "excluded"],
+    [r".*sans enseigne.*", "excluded"],
+    [r".*sans marque.*", "excluded"],
+    [r".*station commun.*", "excluded"],
+    [r".*aucune.*", "excluded"],
+    [r".*autre.*", "excluded"],
+]
+
+_compiled_rules = [(re.compile(pattern), name) for pattern, name in operationsList]
+
+
+# -----------------------
+# --- CANONICALIZER ---
+# -----------------------
+
+
+# Lower case and strip accents from a raw enseigne name
+def normalize_enseigne(raw):
+    raw = unicodedata.normalize("NFKD", str(raw).lower())
+    return raw.encode("ascii", errors="ignore").decode("utf-8")
+
+
+# Resolve a single raw enseigne name to its canonical name
+def resolve_enseigne(raw):
+    name = normalize_enseigne(raw)
+    for pattern, new_name in _compiled_rules:
+        if pattern.search(name):
+            return pattern.sub(new_name, name)
+    return name
+
+
+# Build the raw -> canonical mapping table for the unique names of a series
+def build_enseignes_mapping(enseignes):
+    raw = pd.Series(enseignes.dropna().unique(), dtype=object)
+    return pd.DataFrame({"Raw": raw, "Enseignes": raw.map(resolve_enseigne)})
+
+
+# Canonicalize a series of raw enseigne names. The names are deduplicated
+# first, so each one is resolved once, and the result is mapped back to the
+# rows through a categorical. An existing mapping table (see
+# build_enseignes_mapping) can be given to skip the names it already covers.
+def canonicalize_enseignes(enseignes, mapping=None):
+    codes, uniques = pd.factorize(enseignes)
+
+    known = {} if mapping is None else dict(zip(mapping["Raw"], mapping["Enseignes"]))
+    canonical = pd.Categorical(
+        [known[raw] if raw in known else resolve_enseigne(raw) for raw in uniques]
+    )
+
+    canonical_codes = canonical.codes[codes]
+    canonical_codes[codes == -1] = -1
+    return pd.Series(
+        pd.Categorical.from_codes(canonical_codes, canonical.categories),
+        index=enseignes.index,
+        name=enseignes.name,
+    )
+
+
+# -------------------
+# --- PERSISTENCE ---
+# -------------------
+
+
+def save_enseignes_mapping(mapping, path):
+    mapping.to_csv(path, index=False)
+
+
+def load_enseignes_mapping(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
@@ -0,0 +1,73 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+# Narrow dtypes used while reading the yearly price file. IDs are read as a
+# nullable integer so that rows with a missing ID can still be dropped.
+PRIX_DTYPES = {
+    "ID": "Int32",
+    "id": "Int32",
+    "Date": "string",
+    **{fuel: "float32" for fuel in FUEL_COLUMNS},
+}
+
+CHUNKSIZE = 500_000
+
+
+# -----------------
+# --- EXTRACTOR ---
+# -----------------
+
+
+def _clean_chunk(chunk):
+    chunk = chunk.rename(columns={"id": "ID"}).dropna()
+    chunk["ID"] = chunk["ID"].astype("int32")
+    chunk["Date"] = pd.to_datetime(chunk["Date"], format="%Y-%m-%d")
+    return chunk
+
+
+# Stream a price file and keep the rows of the requested window:
+# - start / end: explicit date range (both bounds included)
+# - window: a pd.Timedelta counted back from `end`, or from the last date of
+#   the file when no end is given
+# Only the rows in the window are kept in memory, so peak memory is bounded by
+# the chunk size plus the size of the window.
+def extract_prices(path, start=None, end=None, window=None, chunksize=CHUNKSIZE):
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    if window is not None and end is not None:
+        start = end - window
+
+    kept = []
+    max_date = None
+
+    for chunk in pd.read_csv(path, dtype=PRIX_DTYPES, chunksize=chunksize):
+        chunk = _clean_chunk(chunk)
+        if chunk.empty:
+            continue
+
+        mask = pd.Series(True, index=chunk.index)
+        if start is not None:
+            mask &= chunk["Date"] >= start
+        if end is not None:
+            mask &= chunk["Date"] <= end
+
+        # Relative window on the last date of the file: we only know the cutoff
+        # once the whole file is read, so we keep the rows after the running
+        # cutoff and prune the previous chunks as the last date moves forward
+        if window is not None and end is None:
+            chunk_max = chunk["Date"].max()
+            if max_date is None or chunk_max > max_date:
+                max_date = chunk_max
+                kept = [df[df["Date"] >= max_date - window] for df in kept]
+            mask &= chunk["Date"] >= max_date - window
+
+        kept.append(chunk[mask])
+
+    if not kept:
+        return pd.DataFrame(columns=["ID", "Date", *FUEL_COLUMNS])
+
+    return pd.concat(kept, ignore_index=True)
@@ -0,0 +1,116 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import datetime
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+
+def _to_ordinal(dates):
+    # Same scale as date.toordinal(): days since 0001-01-01 (ordinal 1)
+    days = pd.to_datetime(pd.Series(dates)).values.astype("datetime64[D]")
+    return days.astype(np.int64) + 719163
+
+
+# ---------------------
+# --- TREND FITTING ---
+# ---------------------
+
+# Dates enter the sums as days from this origin, to keep them well conditioned
+ORIGIN = datetime.date(2024, 1, 1).toordinal()
+
+SUM_COLUMNS = ["N", "Sum_X", "Sum_Y", "Sum_XX", "Sum_XY"]
+
+
+# Least squares sums of every (station, fuel). Prices equal to 0 (fuel not
+# sold) are left out.
+def trend_sums(df_prix, fuels=FUEL_COLUMNS):
+    df_prix = df_prix.rename(columns={"id": "ID"})
+    x = (_to_ordinal(df_prix["Date"]) - ORIGIN).astype(float)[:, None]
+    y = df_prix[fuels].to_numpy(dtype=float)
+    sold = (y != 0) & ~np.isnan(y)
+    y = np.where(sold, y, 0.0)
+
+    # One wide grouped sum over the station IDs for all the fuels at once
+    terms = {
+        "N": sold.astype(float),
+        "Sum_X": sold * x,
+        "Sum_Y": y,
+        "Sum_XX": sold * x * x,
+        "Sum_XY": y * x,
+    }
+    wide = pd.DataFrame(
+        np.hstack(list(terms.values())),
+        columns=pd.MultiIndex.from_product([list(terms), fuels]),
+    )
+    sums = wide.groupby(df_prix["ID"].to_numpy()).sum()
+    sums.index.name = "ID"
+
+    sums = sums.stack(level=1, future_stack=True)
+    sums.index = sums.index.set_names(["ID", "Fuel"])
+    return sums[sums["N"] > 0][SUM_COLUMNS]
+
+
+# Slope and intercept (price = Slope * date ordinal + Intercept) from the sums
+def solve_trends(sums):
+    n = sums["N"]
+    x_mean = sums["Sum_X"] / n
+    y_mean = sums["Sum_Y"] / n
+    sxx = sums["Sum_XX"] - n * x_mean**2
+    sxy = sums["Sum_XY"] - n * x_mean * y_mean
+
+    # A single date gives no trend: flat line at the mean price
+    slope = (sxy / sxx.where(sxx > 1e-9)).fillna(0.0)
+    return sums[SUM_COLUMNS].assign(
+        Slope=slope, Intercept=y_mean - slope * (x_mean + ORIGIN)
+    )
+
+
+# Fit a linear trend for every (station, fuel) at once. The least squares
+# solution only needs a few sums per group, so the whole fleet is fitted with
+# one grouped aggregation, and the sums are kept in the coefficients table.
+def fit_trends(df_prix, fuels=FUEL_COLUMNS):
+    return solve_trends(trend_sums(df_prix, fuels))
+
+
+# Add new price rows to an existing coefficients table, and optionally remove
+# the contribution of old rows (days leaving the window or being replaced)
+def update_trends(coefficients, df_prix_new, fuels=FUEL_COLUMNS, df_prix_old=None):
+    sums = coefficients[SUM_COLUMNS].add(trend_sums(df_prix_new, fuels), fill_value=0)
+    if df_prix_old is not None and len(df_prix_old) > 0:
+        sums = sums.sub(trend_sums(df_prix_old, fuels), fill_value=0)
+        sums = sums[sums["N"] > 0.5]
+    return solve_trends(sums)
+
+
+# ------------------
+# --- PREDICTION ---
+# ------------------
+
+
+# Predicted prices of one station and fuel for the given dates, from the
+# coefficients table returned by fit_trends. NaN when the station has no
+# price for that fuel.
+def predict(coefficients, station_id, fuel, dates):
+    try:
+        slope, intercept = coefficients.loc[(station_id, fuel), ["Slope", "Intercept"]]
+    except KeyError:
+        slope, intercept = np.nan, np.nan
+    return slope * _to_ordinal(dates) + intercept
+
+
+# Predicted prices of many (station, fuel, date) rows at once (the columns ID,
+# Fuel and Date of df_targets), from the coefficients table returned by
+# fit_trends. NaN for the (station, fuel) pairs without coefficients.
+def predict_rows(coefficients, df_targets):
+    df_coefficients = df_targets[["ID", "Fuel"]].merge(
+        coefficients[["Slope", "Intercept"]].reset_index(),
+        on=["ID", "Fuel"],
+        how="left",
+    )
+    return (
+        df_coefficients["Slope"].to_numpy() * _to_ordinal(df_targets["Date"])
+        + df_coefficients["Intercept"].to_numpy()
+    )
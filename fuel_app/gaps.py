@@ -0,0 +1,102 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.prices import long_prices
+from fuel_app.schema import FUEL_COLUMNS
+
+# Distances below this value (km) weigh as much as this value in the
+# distance-weighted mean, so that a competitor next door does not take all
+# the weight
+MIN_DISTANCE_KM = 0.5
+
+GAP_COLUMNS = [
+    "Price",
+    "Competitors",
+    "Mean",
+    "Min",
+    "Median",
+    "Weighted_mean",
+    "Gap_mean",
+    "Gap_min",
+    "Gap_median",
+    "Gap_weighted",
+    "Percentile",
+]
+
+
+# ------------------
+# --- PRICE GAPS ---
+# ------------------
+
+
+# Position of every station of the graph against its competitors, for every
+# fuel and date where both the station and at least one competitor sell it:
+# - Mean / Min / Median / Weighted_mean: competitor prices, the weighted mean
+#   using the inverse of the distance as weight
+# - Gap_*: price of the station minus the competitor statistic (> 0 when the
+#   station is more expensive)
+# - Percentile: share of the competitors cheaper than the station (ties count
+#   for half), from 0 (cheapest) to 100 (most expensive)
+# df_edges is the (ID, Concurrent_ID, Distance) table of the competitor graph,
+# joined once to the prices: every statistic is a grouped aggregation over
+# (ID, Date, Fuel), without a loop over the stations. Only the competitors
+# within radius_km are used, when given.
+def price_gaps(df_edges, df_prix, fuels=FUEL_COLUMNS, radius_km=None):
+    if radius_km is not None:
+        df_edges = df_edges[df_edges["Distance"] <= radius_km]
+    df_long = long_prices(df_prix, fuels)
+
+    df_own = df_long[df_long["ID"].isin(df_edges["ID"].unique())]
+    df_competitors = df_edges[["ID", "Concurrent_ID", "Distance"]].merge(
+        df_long.rename(columns={"ID": "Concurrent_ID"}), on="Concurrent_ID"
+    )
+    df_competitors = df_competitors.merge(
+        df_own.rename(columns={"Price": "Own"}), on=["ID", "Date", "Fuel"]
+    )
+
+    price = df_competitors["Price"].to_numpy()
+    own = df_competitors["Own"].to_numpy()
+    weight = 1.0 / np.maximum(
+        df_competitors["Distance"].to_numpy(dtype=float), MIN_DISTANCE_KM
+    )
+    df_competitors = df_competitors.assign(
+        Weight=weight,
+        Weighted=weight * price,
+        Cheaper=(price < own) + 0.5 * (price == own),
+    )
+
+    df_gaps = df_competitors.groupby(["ID", "Date", "Fuel"], observed=True).agg(
+        Price=("Own", "first"),
+        Competitors=("Price", "size"),
+        Mean=("Price", "mean"),
+        Min=("Price", "min"),
+        Median=("Price", "median"),
+        Weight=("Weight", "sum"),
+        Weighted=("Weighted", "sum"),
+        Cheaper=("Cheaper", "sum"),
+    )
+    df_gaps["Weighted_mean"] = df_gaps["Weighted"] / df_gaps["Weight"]
+    for stat in ["Mean", "Min", "Median"]:
+        df_gaps[f"Gap_{stat.lower()}"] = df_gaps["Price"] - df_gaps[stat]
+    df_gaps["Gap_weighted"] = df_gaps["Price"] - df_gaps["Weighted_mean"]
+    df_gaps["Percentile"] = 100 * df_gaps["Cheaper"] / df_gaps["Competitors"]
+    return df_gaps[GAP_COLUMNS]
+
+
+# Rows of one station and date, indexed by fuel
+def station_gaps(df_gaps, station_id, date):
+    try:
+        return df_gaps.loc[(int(station_id), pd.Timestamp(date))]
+    except KeyError:
+        return df_gaps.iloc[0:0].droplevel(["ID", "Date"])
+
+
+# Rows of all the stations for one date, indexed by (ID, Fuel)
+def date_gaps(df_gaps, date):
+    try:
+        return df_gaps.xs(pd.Timestamp(date), level="Date")
+    except KeyError:
+        return df_gaps.iloc[0:0].droplevel("Date")
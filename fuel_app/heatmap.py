@@ -0,0 +1,103 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.prices import long_prices
+from fuel_app.schema import FUEL_COLUMNS
+
+# Cell size (in degrees) of each level of the pyramid, from the national view
+# to the city view: a level is 4 times finer than the previous one
+GRID_LEVELS = [0.4, 0.1, 0.025]
+
+GRID_INDEX = ["Level", "Date", "Fuel", "Cell_y", "Cell_x"]
+
+# Most cells drawn on the map: the finest level with fewer cells in view is
+# used
+MAX_CELLS = 2500
+
+# Metropolitan France, [[south, west], [north, east]]
+FRANCE_BOUNDS = [[41.3, -5.2], [51.1, 9.6]]
+
+
+# ------------------
+# --- PRICE GRID ---
+# ------------------
+
+# The pyramid holds, for each level, date, fuel and cell of a regular
+# latitude / longitude grid, the mean price of the stations of the cell and
+# their number. Cells are identified by their integer coordinates (latitude
+# and longitude divided by the cell size, rounded down), so the pyramid only
+# stores small integers and float32 values. The cells of a date only depend
+# on the prices of that date.
+
+
+def _cell(degrees, size):
+    return np.floor(degrees / size).astype(np.int16)
+
+
+def build_price_grid(df_prix, df_stations, fuels=FUEL_COLUMNS, levels=GRID_LEVELS):
+    # Coordinates of the prepared stations are in 1e-5 degrees
+    df_coordinates = pd.DataFrame(
+        {
+            "ID": df_stations["ID"].astype(int),
+            "Latitude": df_stations["Latitude"].astype(float) / 100000,
+            "Longitude": df_stations["Longitude"].astype(float) / 100000,
+        }
+    )
+    df_long = long_prices(df_prix, fuels).merge(df_coordinates, on="ID")
+
+    grids = []
+    for level, size in enumerate(levels):
+        grid = (
+            df_long.assign(
+                Level=np.int8(level),
+                Cell_y=_cell(df_long["Latitude"], size),
+                Cell_x=_cell(df_long["Longitude"], size),
+            )
+            .groupby(GRID_INDEX, observed=True)["Price"]
+            .agg(Mean="mean", Stations="size")
+        )
+        grids.append(grid)
+
+    grid = pd.concat(grids).sort_index()
+    return grid.astype({"Mean": "float32", "Stations": "int32"})
+
+
+# --------------
+# --- LOOKUP ---
+# --------------
+
+
+# Cells of one level, date and fuel, in the given bounds ([[south, west],
+# [north, east]]) if any. The index is sorted, so the lookup is a binary
+# search rather than a scan of the pyramid.
+def grid_cells(grid, level, date, fuel, bounds=None, levels=GRID_LEVELS):
+    try:
+        cells = grid.loc[(level, pd.Timestamp(date), fuel)]
+    except KeyError:
+        return grid.iloc[0:0].droplevel(["Level", "Date", "Fuel"])
+    if bounds is None:
+        return cells
+
+    size = levels[level]
+    (south, west), (north, east) = bounds
+    cell_y = cells.index.get_level_values("Cell_y")
+    cell_x = cells.index.get_level_values("Cell_x")
+    in_view = (
+        (cell_y >= np.floor(south / size))
+        & (cell_y <= np.floor(north / size))
+        & (cell_x >= np.floor(west / size))
+        & (cell_x <= np.floor(east / size))
+    )
+    return cells[in_view]
+
+
+# Finest level with at most max_cells cells in the bounds, and its cells
+def grid_view(grid, date, fuel, bounds, max_cells=MAX_CELLS, levels=GRID_LEVELS):
+    for level in reversed(range(len(levels))):
+        cells = grid_cells(grid, level, date, fuel, bounds=bounds, levels=levels)
+        if len(cells) <= max_cells:
+            break
+    return level, cells
@@ -0,0 +1,246 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import argparse
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from fuel_app.cube import build_price_cube, update_price_cube
+from fuel_app.data import (
+    AGGREGATES_PATH,
+    CONCURRENTS_GRAPH_PATH,
+    CONCURRENTS_RADIUS_KM,
+    PRIX_PATH,
+    PRIX_STORE_PATH,
+    STATIONS_PATH,
+    file_signature,
+    gaps_version,
+    grid_version,
+    prepare_prix,
+    prepare_stations,
+    signature_digest,
+    store_signature,
+)
+from fuel_app.forecast import fit_trends, update_trends
+from fuel_app.gaps import price_gaps
+from fuel_app.heatmap import build_price_grid
+from fuel_app.moves import last_prices, price_moves
+from fuel_app.neighbours import CompetitorGraph
+from fuel_app.schema import FUEL_COLUMNS
+from fuel_app.store import (
+    prix_dates,
+    read_aggregate,
+    read_prix,
+    write_aggregate,
+    write_prix,
+)
+
+# Number of days kept in the store (same as the 2 weeks extract)
+WINDOW_DAYS = 15
+
+
+# ------------------
+# --- VALIDATION ---
+# ------------------
+
+
+# Check the columns of a new price file and drop the rows that cannot be
+# used: unknown ID or date, negative or non numeric prices
+def validate_prix(df_prix):
+    df_prix = df_prix.rename(columns={"id": "ID"})
+    missing = [col for col in ["ID", "Date", *FUEL_COLUMNS] if col not in df_prix]
+    if missing:
+        raise ValueError(f"Missing columns in price file: {missing}")
+
+    df_prix = df_prix[["ID", "Date", *FUEL_COLUMNS]].copy()
+    df_prix["ID"] = pd.to_numeric(df_prix["ID"], errors="coerce")
+    dates = pd.to_datetime(df_prix["Date"], format="%Y-%m-%d", errors="coerce")
+    df_prix["Date"] = dates.dt.strftime("%Y-%m-%d")
+    for fuel in FUEL_COLUMNS:
+        prices = pd.to_numeric(df_prix[fuel], errors="coerce")
+        df_prix[fuel] = prices.where(prices >= 0)
+
+    df_prix = df_prix.dropna()
+    df_prix["ID"] = df_prix["ID"].astype(np.int64)
+    return df_prix
+
+
+# -----------------
+# --- INGESTION ---
+# -----------------
+
+
+# Append new days of prices to the store and update the derived aggregates.
+# Only the new rows, the days they replace and the days leaving the window are
+# read, so the cost does not depend on the length of the history:
+# - without a store, the store is first filled from the 2 weeks extract
+#   (prix_path), so that the app does not lose the history it loads from it
+# - the new rows are validated, cleaned and outlier-clipped on their own
+# - their dates replace the same dates in the store
+# - days older than window_days before the last date are removed
+# - the price cube and the trend coefficients are updated with the added and
+#   removed rows, and saved with the new version of the store, so that the app
+#   caches keyed on the other sources (stations, graph...) stay valid
+# - the price moves are the moves between the prices of the store (as
+#   computed by price_moves from the whole store): while no day leaves the
+#   window, the moves of the new days are computed from the last known prices
+def ingest_prix(
+    df_new,
+    window_days=WINDOW_DAYS,
+    root=PRIX_STORE_PATH,
+    aggregates=AGGREGATES_PATH,
+    stations_path=STATIONS_PATH,
+    prix_path=PRIX_PATH,
+):
+    df_new = prepare_prix(validate_prix(df_new))
+    if df_new.empty:
+        return df_new
+
+    df_stations = prepare_stations(pd.read_csv(stations_path))
+
+    store_dates = prix_dates(root)
+    if not store_dates:
+        if not Path(prix_path).exists():
+            raise FileNotFoundError(
+                f"No price store in {root} and no price extract {prix_path} to "
+                "fill it from, run python -m fuel_app.build prix_store first"
+            )
+        write_prix(prepare_prix(pd.read_csv(prix_path)), root)
+        store_dates = prix_dates(root)
+
+    new_dates = sorted(pd.to_datetime(df_new["Date"].unique()))
+
+    # Current aggregates, computed from the whole store only if they were
+    # never saved for its current version
+    stations_signature = file_signature(stations_path)
+    cube, trends, gaps, grid = None, None, None, None
+    moves, df_last_prices = None, None
+    if store_dates:
+        version = signature_digest(store_signature(root))
+        cube = read_aggregate(aggregates, "cube", version)
+        trends = read_aggregate(aggregates, "trends", version)
+        gaps = read_aggregate(
+            aggregates,
+            "gaps",
+            gaps_version(
+                store_signature(root), stations_signature, CONCURRENTS_RADIUS_KM
+            ),
+        )
+        grid = read_aggregate(
+            aggregates,
+            "grid",
+            grid_version(store_signature(root), stations_signature),
+        )
+        moves = read_aggregate(aggregates, "moves", version)
+        df_last_prices = read_aggregate(aggregates, "last_prices", version)
+        if cube is None or trends is None:
+            df_prix = read_prix(root)
+            cube = build_price_cube(df_prix, df_stations)
+            trends = fit_trends(df_prix)
+
+    # Days removed from the store: replaced by the new rows or out of window
+    last_date = max(new_dates[-1], store_dates[-1] if store_dates else new_dates[-1])
+    cutoff = last_date - pd.Timedelta(days=window_days - 1)
+    expired_dates = [date for date in store_dates if date < cutoff]
+    replaced_dates = sorted(set(new_dates) & set(store_dates))
+    removed_dates = sorted(set(expired_dates) | set(replaced_dates))
+
+    df_new = df_new[df_new["Date"] >= cutoff]
+
+    if cube is None:
+        cube = build_price_cube(df_new, df_stations)
+        trends = fit_trends(df_new)
+    else:
+        df_removed = read_prix(root, dates=removed_dates) if removed_dates else None
+        cube = cube.drop(index=removed_dates, level="Date", errors="ignore")
+        cube = update_price_cube(cube, df_new, df_stations)
+        trends = update_trends(trends, df_new, df_prix_old=df_removed)
+
+    # Update the store
+    for date in removed_dates:
+        shutil.rmtree(Path(root) / f"Date={date.date().isoformat()}")
+    write_prix(df_new, root)
+
+    # Price moves: when the new days come after the stored ones and no day left
+    # the window, their moves are computed from the last known prices only.
+    # Otherwise (days replaced, inserted or expired) the moves are computed
+    # again from the store (at most window_days days): the first prices of
+    # the window have no move, the prices they moved from left the store.
+    appended = (
+        not replaced_dates
+        and not expired_dates
+        and (not store_dates or new_dates[0] > store_dates[-1])
+    )
+    if moves is not None and df_last_prices is not None and appended:
+        moves = pd.concat(
+            [moves, price_moves(df_new, last_prices=df_last_prices)]
+        ).sort_index()
+        df_last_prices = last_prices(df_new, previous=df_last_prices)
+    else:
+        df_prix = read_prix(root)
+        moves = price_moves(df_prix)
+        df_last_prices = last_prices(df_prix)
+
+    version = signature_digest(store_signature(root))
+    write_aggregate(cube, aggregates, "cube", version)
+    write_aggregate(trends, aggregates, "trends", version)
+    write_aggregate(moves, aggregates, "moves", version)
+    write_aggregate(df_last_prices, aggregates, "last_prices", version)
+
+    # The price gaps of a date only depend on the prices of that date: the
+    # gaps of the new dates are added to the saved ones (if any, they are
+    # otherwise computed by the app)
+    graph = None
+    if (CONCURRENTS_GRAPH_PATH / "ids.npy").exists():
+        graph = CompetitorGraph.load(CONCURRENTS_GRAPH_PATH)
+    if (
+        gaps is not None
+        and graph is not None
+        and graph.source == stations_signature[3]
+        and graph.radius_km >= CONCURRENTS_RADIUS_KM
+    ):
+        df_new_gaps = price_gaps(
+            graph.to_frame(), df_new, radius_km=CONCURRENTS_RADIUS_KM
+        )
+        gaps = gaps.drop(index=removed_dates, level="Date", errors="ignore")
+        gaps = pd.concat([gaps, df_new_gaps]).sort_index()
+        write_aggregate(
+            gaps,
+            aggregates,
+            "gaps",
+            gaps_version(
+                store_signature(root), stations_signature, CONCURRENTS_RADIUS_KM
+            ),
+        )
+
+    # Same for the price grid, which only depends on the prices of the date
+    # and the coordinates of the stations
+    if grid is not None:
+        grid = grid.drop(index=removed_dates, level="Date", errors="ignore")
+        grid = pd.concat([grid, build_price_grid(df_new, df_stations)]).sort_index()
+        write_aggregate(
+            grid,
+            aggregates,
+            "grid",
+            grid_version(store_signature(root), stations_signature),
+        )
+    return df_new
+
+
+# -----------
+# --- CLI ---
+# -----------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Append new days of prices to the price store"
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="new price files (CSV)")
+    parser.add_argument("--window-days", type=int, default=WINDOW_DAYS)
+    args = parser.parse_args()
+
+    for path in args.files:
+        df_added = ingest_prix(pd.read_csv(path), window_days=args.window_days)
+        print(f"{path}: {len(df_added)} rows ingested")
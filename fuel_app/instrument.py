@@ -0,0 +1,205 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import collections
+import csv
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+
+# Opt-in diagnostics: shows the diagnostics page and traces the memory
+# allocations (tracemalloc slows the app down, so it is off by default)
+DIAGNOSTICS_ENABLED = os.environ.get("FUEL_APP_DIAGNOSTICS", "") not in ("", "0")
+
+# CSV file the records are appended to, if set
+DIAGNOSTICS_CSV = os.environ.get("FUEL_APP_DIAGNOSTICS_CSV")
+
+# Number of records kept in memory for the diagnostics page
+MAX_RECORDS = 20_000
+
+RECORD_COLUMNS = [
+    "Time",
+    "Session",
+    "Run",
+    "Stage",
+    "Wall (s)",
+    "CPU (s)",
+    "Rows",
+    "Peak memory (MB)",
+]
+
+_records = collections.deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+
+# Run ID and open stages of the current thread (each Streamlit session reruns
+# its script in its own thread)
+_local = threading.local()
+
+
+# ---------------
+# --- RECORDS ---
+# ---------------
+
+
+def start_memory_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# Start a new run (one per rerun of the app script): the following records
+# of the thread are grouped under a new run ID
+def new_run():
+    _local.run = uuid.uuid4().hex[:8]
+    return _local.run
+
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return None if ctx is None else ctx.session_id
+
+
+def _count_rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(result)
+    if isinstance(result, tuple) and result:
+        rows = [_count_rows(item) for item in result]
+        return None if None in rows else sum(rows)
+    return None
+
+
+def _add_record(record):
+    with _lock:
+        _records.append(record)
+        if DIAGNOSTICS_CSV:
+            path = Path(DIAGNOSTICS_CSV)
+            write_header = not path.exists()
+            with open(path, "a", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=RECORD_COLUMNS)
+                if write_header:
+                    writer.writeheader()
+                writer.writerow(record)
+    logger.debug(
+        "%s: %.3fs wall, %.3fs CPU",
+        record["Stage"],
+        record["Wall (s)"],
+        record["CPU (s)"],
+    )
+
+
+def records_frame():
+    with _lock:
+        return pd.DataFrame(list(_records), columns=RECORD_COLUMNS)
+
+
+# Statistics of the records of each stage
+def summary_frame():
+    df_records = records_frame()
+    return (
+        df_records.groupby("Stage")
+        .agg(
+            Calls=("Wall (s)", "size"),
+            Wall_mean=("Wall (s)", "mean"),
+            Wall_p95=("Wall (s)", lambda wall: wall.quantile(0.95)),
+            Wall_total=("Wall (s)", "sum"),
+            CPU_mean=("CPU (s)", "mean"),
+            Rows_mean=("Rows", "mean"),
+            Peak_max=("Peak memory (MB)", "max"),
+        )
+        .rename(columns=lambda col: col.replace("_", " "))
+        .sort_values(by="Wall total", ascending=False)
+    )
+
+
+def clear_records():
+    with _lock:
+        _records.clear()
+
+
+# --------------
+# --- STAGES ---
+# --------------
+
+
+# Wall time, CPU time (of the thread), rows and peak of the memory allocated
+# by a stage, used as a context manager (rows set by the block):
+#     with timed("read prices") as stage:
+#         df = pd.read_csv(path)
+#         stage.rows = len(df)
+# or as a decorator (rows counted on the returned frame):
+#     @timed("prepare stations")
+#     def prepare_stations(df): ...
+# Stages can be nested: the peak of a stage includes the peaks of its inner
+# stages. tracemalloc is process wide, so the peaks of concurrent sessions
+# add up.
+class StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with StageTimer(self.name) as stage:
+                result = function(*args, **kwargs)
+                stage.rows = _count_rows(result)
+            return result
+
+        return wrapper
+
+    def __enter__(self):
+        self._stack = getattr(_local, "stack", None)
+        if self._stack is None:
+            self._stack = _local.stack = []
+        self._stack.append(self)
+
+        self._child_peak = 0
+        self._start_memory = None
+        if tracemalloc.is_tracing():
+            self._start_memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        self._start_cpu = time.thread_time()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.thread_time() - self._start_cpu
+        self._stack.pop()
+
+        peak_mb = np.nan
+        if self._start_memory is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._child_peak)
+            if self._stack:
+                parent = self._stack[-1]
+                parent._child_peak = max(parent._child_peak, peak)
+            peak_mb = (peak - self._start_memory) / 1e6
+
+        _add_record(
+            {
+                "Time": pd.Timestamp.now().isoformat(timespec="milliseconds"),
+                "Session": _session_id(),
+                "Run": getattr(_local, "run", None),
+                "Stage": self.name,
+                "Wall (s)": wall,
+                "CPU (s)": cpu,
+                "Rows": self.rows,
+                "Peak memory (MB)": peak_mb,
+            }
+        )
+        return False
+
+
+def timed(name):
+    return StageTimer(name)
@@ -0,0 +1,101 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import html
+import numpy as np
+
+# -------------
+# --- STYLE ---
+# -------------
+
+KPI_STYLE = """
+<style>
+    .flex-row {
+        width: 100%;
+        display: flex;
+        flex-direction: row;
+    }
+
+    .flex-row > div {
+        flex: 1;
+        border: 1px solid #ccc;
+        border-radius: 10px;
+        padding: 10px;
+        margin: 10px;
+        text-align: center;
+    }
+
+    #no-border {
+        border: none!important;
+    }
+
+    .gas-header, .enseigne {
+        font-weight: bold;
+        font-size: 1.5em;
+    }
+
+    .gas-header > div, .enseigne {
+        border: 2px solid #ccc!important;
+    }
+
+    .data-value {
+        display: flex;
+        align-items: center;
+        justify-content: center;
+    }
+
+    .lowest {
+        border: 1px solid #ff6666!important;
+        border-left : 7px solid #ff6666!important;
+    }
+
+    .highest {
+        border: 1px solid #66ff66!important;
+        border-left : 7px solid #66ff66!important;
+    }
+</style>
+"""
+
+
+# -------------
+# --- TABLE ---
+# -------------
+
+
+# Masks of the lowest and highest value of each column of a (enseigne x fuel)
+# matrix, ties included. NaN (fuel not sold) are never flagged, and a column
+# of NaN has no lowest nor highest value.
+def extreme_masks(values):
+    missing = np.isnan(values)
+    lowest = values == np.where(missing, np.inf, values).min(axis=0)
+    highest = values == np.where(missing, -np.inf, values).max(axis=0)
+    return lowest, highest & ~lowest
+
+
+def _cell(value, css_class):
+    text = "-" if np.isnan(value) else f"{value:.3f}"
+    return f'<div class="data-value {css_class}">{text}</div>'
+
+
+# Whole KPI table as one HTML block: a header row with the fuels, then one row
+# per enseigne with its prices, the lowest and highest price of each fuel
+# highlighted. names maps the enseignes (index of table) to display names.
+def kpi_table_html(table, names=None):
+    names = names or {}
+    values = table.to_numpy(dtype=float)
+    lowest, highest = extreme_masks(values)
+    css_classes = np.where(lowest, "lowest", np.where(highest, "highest", ""))
+
+    header = "".join(f"<div>{html.escape(str(fuel))}</div>" for fuel in table.columns)
+    rows = [
+        f'<div class="flex-row gas-header"><div id="no-border"></div>{header}</div>'
+    ]
+    for enseigne, row_values, row_classes in zip(table.index, values, css_classes):
+        name = html.escape(names.get(enseigne, str(enseigne).title()))
+        cells = "".join(map(_cell, row_values, row_classes))
+        rows.append(
+            f'<div class="flex-row data-row"><div class="enseigne">{name}</div>{cells}</div>'
+        )
+
+    return KPI_STYLE + '<div class="main-container">' + "".join(rows) + "</div>"
@@ -0,0 +1,146 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import branca.colormap
+import folium
+from folium.plugins import FastMarkerCluster
+from fuel_app.heatmap import grid_cells
+
+# --------------
+# --- POPUPS ---
+# --------------
+
+
+# Popup of each station, built with vectorized string concatenation
+def station_popups(df_stations):
+    return (
+        "<b>"
+        + df_stations["Enseignes"].astype(str)
+        + "</b><br><br>"
+        + df_stations["Adresse"].astype(str)
+        + "<br>"
+        + df_stations["Ville"].astype(str)
+    )
+
+
+# --------------
+# --- LAYERS ---
+# --------------
+
+
+# GeoJSON FeatureCollection of stations (coordinates in degrees), with the
+# popup stored as a feature property
+def stations_feature_collection(df_stations):
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"popup": popup},
+        }
+        for lat, lon, popup in zip(
+            df_stations["Latitude"].tolist(),
+            df_stations["Longitude"].tolist(),
+            station_popups(df_stations).tolist(),
+        )
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+# All the stations of df_stations as a single GeoJSON layer, drawn with the
+# same marker instead of one folium.Marker object per station
+def stations_layer(df_stations, color="blue", name=None):
+    return folium.GeoJson(
+        stations_feature_collection(df_stations),
+        name=name,
+        marker=folium.Marker(icon=folium.Icon(color=color)),
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+    )
+
+
+# Markers are created in the browser from a plain [lat, lon, popup] array and
+# clustered by Leaflet.markercluster
+_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+};
+"""
+
+
+# Clustered layer able to show thousands of stations, only the markers in
+# view are expanded by the browser
+def stations_cluster_layer(df_stations, name=None):
+    data = list(
+        zip(
+            df_stations["Latitude"].tolist(),
+            df_stations["Longitude"].tolist(),
+            station_popups(df_stations).tolist(),
+        )
+    )
+    return FastMarkerCluster(data, callback=_CLUSTER_CALLBACK, name=name)
+
+
+# ------------------
+# --- PRICE GRID ---
+# ------------------
+
+
+# Color scale of the mean prices of a date and fuel, from the 5th to the 95th
+# percentile of the national cells (so the colors do not change with the
+# zoom level)
+def price_colormap(grid, date, fuel):
+    prices = grid_cells(grid, 0, date, fuel)["Mean"]
+    vmin, vmax = prices.quantile([0.05, 0.95]).tolist() if len(prices) else (0.0, 1.0)
+    if vmin == vmax:
+        vmax = vmin + 0.01
+    return branca.colormap.LinearColormap(
+        ["#1a9850", "#fee08b", "#d73027"],
+        vmin=vmin,
+        vmax=vmax,
+        caption=f"Mean price of {fuel} (€/L)",
+    )
+
+
+# Cells as a single GeoJSON layer of rectangles colored by their mean price
+def price_grid_layer(cells, size, colormap, name=None):
+    cell_y = cells.index.get_level_values("Cell_y").to_numpy() * size
+    cell_x = cells.index.get_level_values("Cell_x").to_numpy() * size
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [
+                    [
+                        [x, y],
+                        [x + size, y],
+                        [x + size, y + size],
+                        [x, y + size],
+                        [x, y],
+                    ]
+                ],
+            },
+            "properties": {
+                "color": colormap(mean),
+                "tooltip": f"{mean:.3f} €/L ({stations} stations)",
+            },
+        }
+        for y, x, mean, stations in zip(
+            cell_y.tolist(),
+            cell_x.tolist(),
+            cells["Mean"].tolist(),
+            cells["Stations"].tolist(),
+        )
+    ]
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name=name,
+        style_function=lambda feature: {
+            "fillColor": feature["properties"]["color"],
+            "fillOpacity": 0.6,
+            "weight": 0,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False),
+    )
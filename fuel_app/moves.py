@@ -0,0 +1,112 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+MOVES_INDEX = ["Date", "ID", "Fuel"]
+
+MOVE_COLUMNS = ["Old", "New", "Delta"]
+
+
+# -------------------
+# --- PRICE MOVES ---
+# -------------------
+
+# A move is a change of the price of a fuel at a station, from the last known
+# price (the last day the fuel was sold, prices equal to 0 are skipped) to the
+# price of the day. Moves are indexed by (Date, ID, Fuel), so the moves of a
+# day are a binary search away.
+
+
+# Moves of every station and fuel in df_prix, in one pass over the prices
+# sorted by (ID, Date): the last known prices are forward filled and shifted
+# by station, for all the fuels at once. last_prices (see last_prices below)
+# are the prices known before the first date of df_prix, so that new days are
+# processed without the previous ones.
+def price_moves(df_prix, fuels=FUEL_COLUMNS, last_prices=None):
+    df_prix = df_prix.rename(columns={"id": "ID"})[["ID", "Date", *fuels]]
+    if last_prices is not None:
+        # Typed like the prices, so that the concatenation does not depend on
+        # the all-NA columns (the unknown date, fuels never sold)
+        df_known = last_prices[fuels].reset_index().assign(Date=pd.NaT)
+        df_known = df_known[df_prix.columns].astype(df_prix.dtypes.to_dict())
+        df_prix = pd.concat([df_known, df_prix], ignore_index=True)
+    df_prix = df_prix.sort_values(
+        by=["ID", "Date"], na_position="first", kind="stable", ignore_index=True
+    )
+
+    ids = df_prix["ID"].to_numpy()
+    prices = df_prix[fuels].astype(float)
+    prices = prices.where(prices > 0)
+    known = prices.groupby(ids).ffill().to_numpy()
+
+    # Previous known price: the row above, when it belongs to the same station
+    old = np.full_like(known, np.nan)
+    old[1:] = known[:-1]
+    old[1:][ids[1:] != ids[:-1]] = np.nan
+
+    new = prices.to_numpy()
+    delta = np.round(new - old, 3)
+    rows, cols = np.nonzero(~np.isnan(delta) & (delta != 0))
+
+    df_moves = pd.DataFrame(
+        {
+            "Date": df_prix["Date"].to_numpy()[rows],
+            "ID": ids[rows].astype(np.int32),
+            "Fuel": pd.Categorical.from_codes(cols, categories=fuels),
+            "Old": old[rows, cols].astype(np.float32),
+            "New": new[rows, cols].astype(np.float32),
+            "Delta": delta[rows, cols].astype(np.float32),
+        }
+    )
+    return df_moves.set_index(MOVES_INDEX).sort_index()
+
+
+# Last known price of every station and fuel (NaN if never sold), indexed by
+# ID, updated with new days of prices when last_prices is given
+def last_prices(df_prix, fuels=FUEL_COLUMNS, previous=None):
+    df_prix = df_prix.rename(columns={"id": "ID"}).sort_values(by="Date", kind="stable")
+    prices = df_prix[fuels].astype(float)
+    df_last = prices.where(prices > 0).groupby(df_prix["ID"].to_numpy()).last()
+    df_last.index.name = "ID"
+    if previous is not None:
+        df_last = df_last.combine_first(previous[fuels])
+    return df_last
+
+
+# --------------
+# --- LOOKUP ---
+# --------------
+
+
+# Moves of one date of at least min_delta (in €/L, up or down), indexed by
+# (ID, Fuel)
+def date_moves(df_moves, date, min_delta=0.0):
+    try:
+        df_day = df_moves.loc[pd.Timestamp(date)]
+    except KeyError:
+        return df_moves.iloc[0:0].droplevel("Date")
+    return df_day[df_day["Delta"].abs() >= min_delta]
+
+
+# Moves of the competitors of the stations of the competitor graph (df_edges:
+# ID, Concurrent_ID, Distance) on one date, of at least min_delta: for every
+# station, the moves of its competitors, e.g. "the competitors of station X
+# moved more than 2 cents today" with station_id=X and min_delta=0.02.
+# Without station_id, the moves of the competitors of all the stations.
+def competitor_moves(df_moves, df_edges, date, min_delta=0.0, station_id=None):
+    if station_id is not None:
+        df_edges = df_edges[df_edges["ID"] == int(station_id)]
+    df_day = (
+        date_moves(df_moves, date, min_delta)
+        .reset_index()
+        .rename(columns={"ID": "Concurrent_ID"})
+    )
+    return (
+        df_edges[["ID", "Concurrent_ID", "Distance"]]
+        .merge(df_day, on="Concurrent_ID")
+        .sort_values(by=["ID", "Distance"], ignore_index=True)
+    )
@@ -0,0 +1,161 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Mean Earth radius in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+
+# -----------------
+# --- HAVERSINE ---
+# -----------------
+
+
+# Vectorized haversine distance (in km) between points given in degrees,
+# works on scalars as well as on broadcastable NumPy arrays
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+# ------------------------
+# --- NEIGHBOUR SEARCH ---
+# ------------------------
+
+
+# BallTree on radians using the haversine metric, built once and queried with
+# any radius
+def build_index(df):
+    coords = np.radians(df[["Latitude", "Longitude"]].to_numpy(dtype=float))
+    # Imported here: scikit-learn takes about a second to import and is only
+    # needed when the competitor graph is not saved
+    from sklearn.neighbors import BallTree
+
+    return BallTree(coords, metric="haversine")
+
+
+# For each station of df_from, find every station of df_to within radius_km.
+# Coordinates are expected in degrees. Returns one row per (station, neighbour)
+# pair with the distance in km, sorted by station then distance.
+def find_neighbours(df_from, df_to, radius_km=10.0, index=None):
+    if index is None:
+        index = build_index(df_to)
+
+    coords = np.radians(df_from[["Latitude", "Longitude"]].to_numpy(dtype=float))
+    positions, distances = index.query_radius(
+        coords, r=radius_km / EARTH_RADIUS_KM, return_distance=True
+    )
+
+    counts = np.array([len(p) for p in positions], dtype=np.int64)
+    if len(positions) > 0:
+        positions = np.concatenate(positions)
+        distances = np.concatenate(distances)
+    else:
+        positions = np.empty(0, dtype=np.int64)
+        distances = np.empty(0)
+
+    df_neighbours = pd.DataFrame(
+        {
+            "ID": np.repeat(df_from["ID"].values, counts),
+            "Concurrent_ID": df_to["ID"].values[positions],
+            "Distance": distances * EARTH_RADIUS_KM,
+        }
+    )
+    return df_neighbours.sort_values(by=["ID", "Distance"], ignore_index=True)
+
+
+# -----------------------
+# --- COMPETITOR GRAPH ---
+# -----------------------
+
+
+# Compact adjacency (CSR layout) of the neighbours table: the neighbours of
+# the station ids[i] are neighbours[offsets[i]:offsets[i + 1]], sorted by
+# distance. Station IDs are sorted, so finding a station is a binary search.
+# The arrays are saved as .npy files and can be memory-mapped.
+class CompetitorGraph:
+    FILES = ["ids", "offsets", "neighbours", "distances", "radius_km", "source"]
+
+    def __init__(self, ids, offsets, neighbours, distances, radius_km, source=""):
+        self.ids = ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.distances = distances
+        self.radius_km = float(radius_km)
+        self.source = str(source)
+
+    @classmethod
+    def from_neighbours(cls, df_neighbours, ids, radius_km, source=""):
+        ids = np.unique(np.asarray(ids, dtype=np.int32))
+        df_neighbours = df_neighbours.assign(
+            ID=df_neighbours["ID"].astype(np.int32)
+        ).sort_values(by=["ID", "Distance"], kind="stable")
+
+        counts = np.bincount(
+            np.searchsorted(ids, df_neighbours["ID"].to_numpy()), minlength=len(ids)
+        )
+        offsets = np.zeros(len(ids) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(
+            ids,
+            offsets,
+            df_neighbours["Concurrent_ID"].to_numpy(dtype=np.int32),
+            df_neighbours["Distance"].to_numpy(dtype=np.float32),
+            radius_km,
+            source,
+        )
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.FILES:
+            np.save(directory / f"{name}.npy", np.asarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in cls.FILES
+        }
+        arrays["radius_km"] = arrays["radius_km"].item()
+        arrays["source"] = arrays["source"].item()
+        return cls(**arrays)
+
+    # Neighbours of a station within radius_km (at most the radius the graph
+    # was built with), as (neighbour IDs, distances in km) sorted by distance
+    def neighbours_of(self, station_id, radius_km=None):
+        if radius_km is not None and radius_km > self.radius_km:
+            raise ValueError(
+                f"radius_km={radius_km} is larger than the graph radius "
+                f"({self.radius_km} km)"
+            )
+
+        position = np.searchsorted(self.ids, int(station_id))
+        if position == len(self.ids) or self.ids[position] != int(station_id):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        start, end = self.offsets[position], self.offsets[position + 1]
+        distances = self.distances[start:end]
+        if radius_km is not None:
+            end = start + np.searchsorted(distances, radius_km, side="right")
+            distances = self.distances[start:end]
+        return np.asarray(self.neighbours[start:end]), np.asarray(distances)
+
+    # Long (ID, Concurrent_ID, Distance) table of the whole graph
+    def to_frame(self):
+        return pd.DataFrame(
+            {
+                "ID": np.repeat(self.ids, np.diff(self.offsets)),
+                "Concurrent_ID": np.asarray(self.neighbours),
+                "Distance": np.asarray(self.distances),
+            }
+        )
@@ -0,0 +1,104 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+# Scale factor making the MAD a consistent estimator of the standard deviation
+MAD_SCALE = 1.4826
+
+
+# --------------
+# --- BOUNDS ---
+# --------------
+
+# Each method returns the (lower, upper) bounds of every fuel column, either
+# as 1-row arrays (global) or as frames indexed by group. Zeros (fuel not
+# sold) are masked as NaN beforehand, so they never weigh on the statistics.
+
+
+# Clip to the first and third quartiles (historical behaviour of the app)
+def _quartiles_bounds(prices, groups, k):
+    return _quantile(prices, groups, 0.25), _quantile(prices, groups, 0.75)
+
+
+# Tukey fences: [Q1 - k * IQR, Q3 + k * IQR]
+def _iqr_bounds(prices, groups, k):
+    q1, q3 = _quartiles_bounds(prices, groups, k)
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+
+# Median +/- k scaled median absolute deviations
+def _mad_bounds(prices, groups, k):
+    median = _quantile(prices, groups, 0.5)
+    deviations = np.abs(prices - _broadcast(median, groups))
+    mad = MAD_SCALE * _quantile(deviations, groups, 0.5)
+    return median - k * mad, median + k * mad
+
+
+METHODS = {
+    "quartiles": (_quartiles_bounds, None),
+    "iqr": (_iqr_bounds, 1.5),
+    "mad": (_mad_bounds, 3.0),
+}
+
+
+def _quantile(prices, groups, q):
+    if groups is None:
+        return np.nanquantile(prices.to_numpy(), q, axis=0)[None, :]
+    return prices.groupby(groups, observed=True).quantile(q)
+
+
+# Bounds per group aligned back on the rows of prices
+def _broadcast(bounds, groups):
+    if groups is None:
+        return bounds
+    if len(groups) > 1:
+        rows = pd.MultiIndex.from_arrays(groups)
+    else:
+        rows = pd.Index(groups[0])
+    return bounds.reindex(rows).to_numpy()
+
+
+# ----------------
+# --- CLIPPING ---
+# ----------------
+
+
+# Clip the outliers of the fuel columns of df_prix in one vectorized pass.
+# - method: "quartiles" (clip to [Q1, Q3]), "iqr" or "mad"
+# - by: None for global statistics, or the column name(s) of df_prix / an
+#   array aligned on its rows to compute them per group (per day, per
+#   department, per enseigne...) with a single grouped operation
+# - k: width of the "iqr" / "mad" fences (default 1.5 / 3)
+# Prices equal to 0 or NaN are left as is.
+def clip_outliers(df_prix, fuels=FUEL_COLUMNS, method="quartiles", by=None, k=None):
+    bounds_function, default_k = METHODS[method]
+    k = default_k if k is None else k
+
+    prices = df_prix[fuels].astype(float)
+    prices = prices.mask(prices == 0)
+
+    # Group keys, as a list of arrays aligned on the rows
+    if by is None:
+        groups = None
+    elif isinstance(by, str):
+        groups = [df_prix[by].to_numpy()]
+    elif isinstance(by, list) and all(isinstance(col, str) for col in by):
+        groups = [df_prix[col].to_numpy() for col in by]
+    else:
+        groups = [np.asarray(by)]
+
+    lower, upper = bounds_function(prices, groups, k)
+    clipped = np.clip(
+        prices.to_numpy(),
+        _broadcast(lower, groups),
+        _broadcast(upper, groups),
+    )
+
+    df_prix = df_prix.copy()
+    df_prix[fuels] = np.where(np.isnan(clipped), df_prix[fuels].to_numpy(), clipped)
+    return df_prix
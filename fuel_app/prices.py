@@ -0,0 +1,75 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+# Dates are stored as day numbers (days since 1970-01-01) in the low bits of
+# the (ID, Date) key, which leaves room for ~2800 years of history
+_DAY_BITS = 20
+
+
+def _to_days(dates):
+    dates = pd.to_datetime(pd.Series(dates) if np.ndim(dates) else [dates])
+    return dates.values.astype("datetime64[D]").astype(np.int64)
+
+
+# -------------------
+# --- LONG FORMAT ---
+# -------------------
+
+
+# Long (ID, Date, Fuel, Price) table of the fuels sold (price > 0), one row
+# per station, date and fuel
+def long_prices(df_prix, fuels=FUEL_COLUMNS):
+    df_long = df_prix.rename(columns={"id": "ID"}).melt(
+        id_vars=["ID", "Date"], value_vars=fuels, var_name="Fuel", value_name="Price"
+    )
+    df_long["Fuel"] = pd.Categorical(df_long["Fuel"], categories=fuels)
+    df_long["Price"] = df_long["Price"].astype(float)
+    return df_long[df_long["Price"] > 0]
+
+
+# -------------------
+# --- PRICE INDEX ---
+# -------------------
+
+
+# Prices sorted by (ID, Date) with a packed int64 key per row. A batch of
+# lookups is a pair of np.searchsorted calls on the key array, followed by a
+# single take on the price frame.
+class PriceIndex:
+    def __init__(self, df_prix):
+        df_prix = df_prix.rename(columns={"id": "ID"})
+        days = _to_days(df_prix["Date"])
+        keys = (df_prix["ID"].to_numpy(dtype=np.int64) << _DAY_BITS) | days
+
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.df_prix = df_prix.iloc[order].reset_index(drop=True)
+
+    def _positions(self, ids, start_day, end_day):
+        ids = np.asarray([int(id) for id in ids], dtype=np.int64) << _DAY_BITS
+        lo = np.searchsorted(self.keys, ids | start_day, side="left")
+        hi = np.searchsorted(self.keys, ids | end_day, side="right")
+
+        # Concatenation of the ranges [lo, hi) without a Python loop
+        lengths = hi - lo
+        starts = np.cumsum(lengths) - lengths
+        return np.arange(lengths.sum()) + np.repeat(lo - starts, lengths)
+
+    # Prices of the given stations on one date, in the order of ids
+    def get_prices(self, ids, date):
+        day = _to_days(date)[0]
+        return self.df_prix.take(self._positions(ids, day, day)).reset_index(drop=True)
+
+    # Prices of the given stations between start and end (both included),
+    # ordered by station (in the order of ids) then date
+    def get_range(self, ids, start=None, end=None):
+        start_day = 0 if start is None else _to_days(start)[0]
+        end_day = (1 << _DAY_BITS) - 1 if end is None else _to_days(end)[0]
+        return self.df_prix.take(self._positions(ids, start_day, end_day)).reset_index(
+            drop=True
+        )
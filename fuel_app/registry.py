@@ -0,0 +1,94 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import functools
+import pandas as pd
+
+# ----------------
+# --- DATASETS ---
+# ----------------
+
+
+# Shallow copy of a shared frame. With copy-on-write enabled (see
+# streamlit_app.py), it costs no copy of the data, and a page modifying it only
+# copies the modified columns: the shared frame is never changed.
+def frame_view(df):
+    return df.copy(deep=False)
+
+
+# Prepared frames of the app, shared by every session, with the frames
+# derived for the pages (stations sorted by city, all the stations of the map),
+# and the date bounds of the prices. Nothing is loaded up front: each dataset is
+# loaded on first access with the given loaders, so a page only waits for
+# the data it uses.
+class Datasets:
+    def __init__(
+        self,
+        load_stations,
+        load_prix,
+        load_date_bounds,
+        load_carrefour_split,
+        load_competitor_graph,
+    ):
+        self._load_stations = load_stations
+        self._load_prix = load_prix
+        self._load_date_bounds = load_date_bounds
+        self._load_carrefour_split = load_carrefour_split
+        self._load_competitor_graph = load_competitor_graph
+
+    @functools.cached_property
+    def _stations(self):
+        return self._load_stations()
+
+    @functools.cached_property
+    def _prix(self):
+        return self._load_prix()
+
+    @functools.cached_property
+    def _split(self):
+        df_stations_carrefour, df_stations_others = self._load_carrefour_split()
+        return (
+            df_stations_carrefour.sort_values(by="Ville"),
+            df_stations_others.sort_values(by="Ville"),
+        )
+
+    @functools.cached_property
+    def _stations_all(self):
+        return pd.concat(self._split)
+
+    @functools.cached_property
+    def competitor_graph(self):
+        return self._load_competitor_graph()
+
+    @functools.cached_property
+    def _date_bounds(self):
+        return self._load_date_bounds()
+
+    @property
+    def date_min(self):
+        return self._date_bounds[0]
+
+    @property
+    def date_max(self):
+        return self._date_bounds[1]
+
+    @property
+    def stations(self):
+        return frame_view(self._stations)
+
+    @property
+    def prix(self):
+        return frame_view(self._prix)
+
+    @property
+    def stations_carrefour(self):
+        return frame_view(self._split[0])
+
+    @property
+    def stations_others(self):
+        return frame_view(self._split[1])
+
+    @property
+    def stations_all(self):
+        return frame_view(self._stations_all)
@@ -0,0 +1,52 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import pandas as pd
+
+FUEL_COLUMNS = ["Gazole", "SP95", "SP98", "E10", "E85", "GPLc"]
+
+# --------------
+# --- SCHEMA ---
+# --------------
+
+# Column dtypes of the prepared frames. Repeated strings are categoricals,
+# IDs int32 and prices float32. Dates are datetime64 at day precision (the
+# smallest unit pandas supports is the second), so date filters are
+# vectorized comparisons instead of comparisons of Python date objects.
+
+STATIONS_SCHEMA = {
+    "ID": "int32",
+    "Enseignes": "category",
+    "CP": "category",
+    "Ville": "category",
+    "Type": "category",
+}
+
+PRIX_SCHEMA = {
+    "ID": "int32",
+    "Date": "datetime64[s]",
+    **{fuel: "float32" for fuel in FUEL_COLUMNS},
+}
+
+
+def _apply_schema(df, schema):
+    dtypes = {col: dtype for col, dtype in schema.items() if col in df.columns}
+    df = df.astype(dtypes)
+    if "Date" in dtypes:
+        df["Date"] = df["Date"].dt.floor("D")
+    return df
+
+
+def apply_stations_schema(df_stations):
+    return _apply_schema(df_stations, STATIONS_SCHEMA)
+
+
+def apply_prix_schema(df_prix):
+    return _apply_schema(df_prix, PRIX_SCHEMA)
+
+
+# Dates coming from widgets (datetime.date) or strings, as pd.Timestamp to
+# compare with the Date columns
+def to_timestamp(date):
+    return None if date is None else pd.Timestamp(date)
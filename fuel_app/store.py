@@ -0,0 +1,157 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import uuid
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from fuel_app.schema import apply_prix_schema
+
+# Rows per Parquet row group. Rows are sorted by ID inside each partition, so
+# the row group statistics let station ID filters skip most of the groups.
+ROW_GROUP_SIZE = 4_096
+
+
+# --------------------
+# --- PARTITIONING ---
+# --------------------
+
+
+# Department of a station: first two digits of its postal code
+def departement(cp):
+    return cp.astype(str).str.zfill(5).str[:2]
+
+
+# Prices are partitioned by date only: a day of the whole network is one file
+# of a few row groups sorted by ID
+PRIX_PARTITIONING = ds.partitioning(pa.schema([("Date", pa.date32())]), flavor="hive")
+
+# File holding the generation of the store, a random ID written again after
+# each change of the store. It versions the store without listing its files
+# (files starting with "_" are not part of the dataset).
+GENERATION_FILE = "_generation"
+
+
+# -------------------
+# --- PRICE STORE ---
+# -------------------
+
+
+def store_generation(root):
+    path = Path(root) / GENERATION_FILE
+    return path.read_text() if path.exists() else None
+
+
+# Write prices as a Parquet dataset partitioned by date (Date=YYYY-MM-DD/).
+# Partitions present in df_prix are replaced, the others are left untouched.
+# Days removed from the store by other means must be removed before the
+# call, so that the generation is renewed after them.
+def write_prix(df_prix, root):
+    df_prix = df_prix.rename(columns={"id": "ID"})
+    df_prix = df_prix.assign(Date=pd.to_datetime(df_prix["Date"]).dt.date)
+    table = pa.Table.from_pandas(
+        df_prix.sort_values(by=["Date", "ID"]), preserve_index=False
+    )
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=PRIX_PARTITIONING,
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=ROW_GROUP_SIZE // 4,
+    )
+    (Path(root) / GENERATION_FILE).write_text(uuid.uuid4().hex)
+
+
+# Dates of the partitions of the store, sorted (empty if there is no store)
+def prix_dates(root):
+    return sorted(
+        pd.Timestamp(path.name.split("=", 1)[1]) for path in Path(root).glob("Date=*")
+    )
+
+
+def prix_dataset(root):
+    return ds.dataset(root, format="parquet", partitioning=PRIX_PARTITIONING)
+
+
+# Read prices from the store. The dates (range or list) and the station IDs are
+# pushed down to the dataset scan: partitions outside the requested dates are
+# not opened and row groups without the requested IDs are skipped.
+def read_prix(root, ids=None, start=None, end=None, dates=None, columns=None):
+    dataset = prix_dataset(root)
+
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field("Date") >= pd.Timestamp(start).date())
+    if end is not None:
+        conditions.append(ds.field("Date") <= pd.Timestamp(end).date())
+    if dates is not None:
+        dates = [pd.Timestamp(date).date() for date in dates]
+        conditions.append(ds.field("Date").isin(pa.array(dates, type=pa.date32())))
+    if ids is not None:
+        conditions.append(ds.field("ID").isin([int(id) for id in ids]))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    df_prix = apply_prix_schema(
+        dataset.to_table(columns=columns, filter=expression).to_pandas()
+    )
+    if {"Date", "ID"}.issubset(df_prix.columns):
+        df_prix = df_prix.sort_values(by=["Date", "ID"], ignore_index=True)
+        # Partition columns come last, put the date back next to the ID
+        others = [col for col in df_prix.columns if col not in ("ID", "Date")]
+        df_prix = df_prix[["ID", "Date", *others]]
+    return df_prix
+
+
+# ----------------------
+# --- STATIONS STORE ---
+# ----------------------
+
+
+def write_stations(df_stations, path):
+    df_stations = df_stations.assign(Departement=departement(df_stations["CP"]))
+    pq.write_table(
+        pa.Table.from_pandas(df_stations.sort_values(by="ID"), preserve_index=False),
+        path,
+        row_group_size=ROW_GROUP_SIZE,
+    )
+
+
+def read_stations(path, ids=None, departements=None, columns=None):
+    filters = []
+    if ids is not None:
+        filters.append(("ID", "in", [int(id) for id in ids]))
+    if departements is not None:
+        filters.append(("Departement", "in", list(departements)))
+    return pq.read_table(path, columns=columns, filters=filters or None).to_pandas()
+
+
+# ------------------
+# --- AGGREGATES ---
+# ------------------
+
+# Derived tables (price cube, trends...) are saved next to the store with the
+# version of the prices they were computed from, in a "<name>.version" file
+
+
+def write_aggregate(df, root, name, version):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(root / f"{name}.parquet")
+    (root / f"{name}.version").write_text(version)
+
+
+# Returns None when the aggregate is missing or was computed from another
+# version of the prices
+def read_aggregate(root, name, version):
+    root = Path(root)
+    version_path = root / f"{name}.version"
+    if not version_path.exists() or version_path.read_text() != version:
+        return None
+    return pd.read_parquet(root / f"{name}.parquet")
@@ -0,0 +1,94 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+from fuel_app.schema import FUEL_COLUMNS
+
+# ------------------
+# --- GENERATORS ---
+# ------------------
+
+# Synthetic stations and prices with the schema of Infos_Stations.csv and
+# Prix_*.csv, to measure the pipeline at any scale (see fuel_app.bench).
+# The same seed always gives the same data.
+
+# Raw enseignes names and their share of the stations, close to the real file
+ENSEIGNES_WEIGHTS = {
+    "TotalEnergies": 0.15,
+    "Intermarché": 0.14,
+    "Système U": 0.09,
+    "Carrefour Market": 0.07,
+    "E.Leclerc": 0.07,
+    "TotalEnergies Access": 0.07,
+    "Avia": 0.06,
+    "autre": 0.04,
+    "Carrefour Contact": 0.04,
+    "Esso Express": 0.03,
+    "BP": 0.03,
+    "Carrefour": 0.02,
+    "Auchan": 0.02,
+    "Esso": 0.02,
+    "Casino": 0.02,
+    "ENI": 0.02,
+    "Intermarché Contact": 0.01,
+    "Elan": 0.01,
+    "Dyneff": 0.01,
+    "Shell": 0.01,
+}
+
+# Mean price, daily noise and share of stations not selling each fuel
+FUEL_PRICES = {
+    "Gazole": (1.65, 0.05, 0.1),
+    "SP95": (1.78, 0.05, 0.1),
+    "SP98": (1.85, 0.05, 0.1),
+    "E10": (1.75, 0.05, 0.1),
+    "E85": (0.85, 0.05, 0.6),
+    "GPLc": (0.99, 0.05, 0.6),
+}
+
+# Bounding box of metropolitan France (degrees)
+LATITUDES = (42.5, 51.0)
+LONGITUDES = (-4.5, 8.0)
+
+
+# Stations with the columns of Infos_Stations.csv (coordinates multiplied by
+# 100000, as in the source file)
+def synthetic_stations(n_stations, seed=0):
+    rng = np.random.default_rng(seed)
+    enseignes = list(ENSEIGNES_WEIGHTS)
+    weights = np.array(list(ENSEIGNES_WEIGHTS.values()))
+
+    departements = rng.integers(1, 96, n_stations)
+    cp = departements * 1000 + rng.integers(0, 100, n_stations) * 10
+    return pd.DataFrame(
+        {
+            "ID": departements * 1_000_000 + np.arange(n_stations) % 1_000_000,
+            "Enseignes": rng.choice(enseignes, n_stations, p=weights / weights.sum()),
+            "Latitude": np.round(rng.uniform(*LATITUDES, n_stations) * 100000),
+            "Longitude": np.round(rng.uniform(*LONGITUDES, n_stations) * 100000),
+            "CP": cp,
+            "Adresse": [f"{n % 300 + 1} RUE DE LA GARE" for n in range(n_stations)],
+            "Ville": pd.Series(cp).map(lambda cp: f"VILLE {cp:05d}"),
+            "Type": np.where(rng.random(n_stations) < 0.95, "R", "A"),
+        }
+    ).drop_duplicates(subset="ID", ignore_index=True)
+
+
+# Daily prices of the stations, with the columns of Prix_*.csv. Prices equal
+# to 0 are fuels not sold by the station.
+def synthetic_prix(df_stations, n_days, start="2024-01-01", seed=0):
+    rng = np.random.default_rng(seed)
+    ids = df_stations["ID"].to_numpy()
+    dates = pd.date_range(start, periods=n_days).strftime("%Y-%m-%d")
+    n_rows = len(ids) * n_days
+
+    df_prix = pd.DataFrame(
+        {"ID": np.tile(ids, n_days), "Date": np.repeat(dates.to_numpy(), len(ids))}
+    )
+    for fuel, (mean, noise, not_sold) in FUEL_PRICES.items():
+        sold = rng.random(len(ids)) >= not_sold
+        prices = (mean + rng.normal(0, noise, n_rows)).round(3)
+        df_prix[fuel] = np.where(np.tile(sold, n_days), prices, 0.0)
+    return df_prix
@@ -3,13 +3,20 @@
 # ---------------
 import pandas as pd
 import streamlit as st
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-import plotly.express as px
+from fuel_app.backtest import error_table
+from fuel_app.charts import line_chart
+from fuel_app.data import (
+    load_backtest,
+    load_datasets,
+    load_station_catalogue,
+    load_trends,
+    query_prix,
+)
+from fuel_app.forecast import predict
+from fuel_app.store import departement
+from fuel_app.instrument import timed
 
-df_prix = st.session_state.df_prix
-df_prix = df_prix.rename(columns={"id": "ID"})
-df_stations = st.session_state.df_stations
+datasets = load_datasets()
 
 # ---------------------
 # --- DATE SELECTOR ---
@@ -22,17 +29,17 @@ with col1:
     if "selected_date" not in st.session_state:
         st.session_state.selected_date = st.date_input(
             "Select a start date",
-            value=df_prix["Date"].max(),
-            min_value=df_prix["Date"].min(),
-            max_value=df_prix["Date"].max(),
+            value=datasets.date_max,
+            min_value=datasets.date_min,
+            max_value=datasets.date_max,
             key="subsequent_date_input",
         )
     else:
         st.session_state.selected_date = st.date_input(
             "Select a start date",
             value=st.session_state.selected_date,
-            min_value=df_prix["Date"].min(),
-            max_value=df_prix["Date"].max(),
+            min_value=datasets.date_min,
+            max_value=datasets.date_max,
             key="subsequent_date_input",
         )
 
@@ -41,15 +48,15 @@ with col2:
     if "selected_date_end_ai" not in st.session_state:
         st.session_state.selected_date_end_ai = st.date_input(
             "Select a end date",
-            value=df_prix["Date"].max() + pd.Timedelta(days=1),
-            min_value=df_prix["Date"].max() + pd.Timedelta(days=1),
+            value=datasets.date_max + pd.Timedelta(days=1),
+            min_value=datasets.date_max + pd.Timedelta(days=1),
             key="subsequent_date_input_end",
         )
     else:
         st.session_state.selected_date_end_ai = st.date_input(
             "Select a end date",
             value=st.session_state.selected_date_end_ai,
-            min_value=df_prix["Date"].max() + pd.Timedelta(days=1),
+            min_value=datasets.date_max + pd.Timedelta(days=1),
             key="subsequent_date_input_end",
         )
 
@@ -57,14 +64,8 @@ with col2:
 # --- STATION & FUEL SELECTOR ---
 # -------------------------------
 
-# Create a list of concatenated strings for the selectbox
-station_options = [
-    f"{row['Adresse']}, {row['Ville']} (ID: {row['ID']})"
-    for index, row in df_stations.iterrows()
-]
-
-# Create a mapping from the concatenated string back to the ID
-station_id_mapping = df_stations["ID"].values
+# Selectbox options of the stations, built once
+station_catalogue = load_station_catalogue()
 
 
 col3, col4 = st.columns(2)
@@ -72,26 +73,24 @@ col3, col4 = st.columns(2)
 with col3:
     # If the selected station is not in session state, initialize it
     if "selected_station_ai" not in st.session_state:
-        selected_station_ai_index = st.selectbox(
+        selected_station_ai_label = st.selectbox(
             "Select a station",
-            station_options,
+            station_catalogue.labels,
         )
         # Store the selected ID in session state
-        st.session_state.selected_station_ai = station_id_mapping[
-            station_options.index(selected_station_ai_index)
-        ]
+        st.session_state.selected_station_ai = station_catalogue.id_of(
+            selected_station_ai_label
+        )
     else:
-        selected_station_ai_index = st.selectbox(
+        selected_station_ai_label = st.selectbox(
             "Select a station",
-            station_options,
-            index=station_options.index(
-                f"{df_stations[df_stations['ID'] == st.session_state.selected_station_ai]['Adresse'].values[0]}, {df_stations[df_stations['ID'] == st.session_state.selected_station_ai]['Ville'].values[0]} (ID: {st.session_state.selected_station_ai})"
-            ),
+            station_catalogue.labels,
+            index=station_catalogue.index_of(st.session_state.selected_station_ai),
         )
         # Update the selected station ID in session state
-        st.session_state.selected_station_ai = station_id_mapping[
-            station_options.index(selected_station_ai_index)
-        ]
+        st.session_state.selected_station_ai = station_catalogue.id_of(
+            selected_station_ai_label
+        )
 
 with col4:
     carburant = st.selectbox(
@@ -101,27 +100,12 @@ with col4:
 # Filter df
 selected_station_ai_id = st.session_state.selected_station_ai
 
-df_filtered = df_prix[df_prix["ID"] == selected_station_ai_id]
-
-print(df_filtered)
-
-# Convert dates to ordinal
-df_filtered["Date_Ordinal"] = df_filtered["Date"].apply(lambda x: x.toordinal())
-
-# Split the data into training and testing sets
-X = df_filtered[["Date_Ordinal"]].values
-y = df_filtered[carburant].values
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
-
-# Create and train the model
-model = LinearRegression()
-
-model.fit(X_train, y_train)
+with timed("AI model: station prices") as stage:
+    df_filtered = query_prix(ids=[selected_station_ai_id])
+    stage.rows = len(df_filtered)
 
-# Predict the closing price each days until the end date
+# Predict the closing price each days until the end date, from the trends
+# fitted once for every station and fuel
 
 date_range = pd.date_range(
     start=st.session_state.selected_date,
@@ -129,11 +113,10 @@ date_range = pd.date_range(
     freq="D",
 )
 
-date_range_ordinal = (
-    date_range.to_series().apply(lambda x: x.toordinal()).values.reshape(-1, 1)
-)
-
-predicted_prices = model.predict(date_range_ordinal)
+with timed("AI model: prediction"):
+    predicted_prices = predict(
+        load_trends(), selected_station_ai_id, carburant, date_range
+    )
 
 # Create a dataframe with the predicted prices
 df_predicted_prices = pd.DataFrame(
@@ -143,11 +126,9 @@ df_predicted_prices = pd.DataFrame(
     }
 )
 
-print(df_predicted_prices)
+# Plot the past data (downsampled, see fuel_app.charts) and forecasted prices, forecasted data is dotted line
 
-# Plot the past data and forecasted prices using plotly express, forecasted data is dotted line
-
-fig = px.line(
+fig = line_chart(
     df_filtered,
     x="Date",
     y=carburant,
@@ -163,3 +144,49 @@ fig.add_scatter(
 )
 
 st.plotly_chart(fig)
+
+# ---------------------------
+# --- PREDICTION ACCURACY ---
+# ---------------------------
+
+# Errors of the trend model in the rolling origin backtest (python -m
+# fuel_app.backtest), by number of days after the last known price
+st.subheader("Prediction accuracy")
+
+df_backtest = load_backtest()
+
+if df_backtest is None:
+    st.info("No backtest of the current prices: run python -m fuel_app.backtest.")
+else:
+    with timed("AI model: backtest errors"):
+        df_stations = datasets.stations
+        station_row = station_catalogue.row_of(selected_station_ai_id)
+        station_departement = departement(pd.Series([station_row["CP"]])).iloc[0]
+        ids_by_scope = {
+            "This station": [int(selected_station_ai_id)],
+            f"Enseigne {station_row['Enseignes']}": df_stations.loc[
+                df_stations["Enseignes"] == station_row["Enseignes"], "ID"
+            ],
+            f"Departement {station_departement}": df_stations.loc[
+                departement(df_stations["CP"]) == station_departement, "ID"
+            ],
+            "All stations": df_stations["ID"],
+        }
+
+        models = df_backtest.index.get_level_values("Model")
+        fuels = df_backtest.index.get_level_values("Fuel")
+        df_sums = df_backtest[(models == "linear_trend") & (fuels == carburant)]
+        df_accuracy = pd.concat(
+            {
+                scope: error_table(
+                    df_sums[df_sums.index.get_level_values("ID").isin(ids)],
+                    df_stations,
+                    by=["Horizon"],
+                )["MAE"]
+                for scope, ids in ids_by_scope.items()
+            },
+            axis=1,
+        )
+
+    st.caption("Mean absolute error (€/L) by horizon (days)")
+    st.dataframe(df_accuracy.style.format(precision=4), use_container_width=True)
@@ -0,0 +1,58 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import streamlit as st
+import plotly.express as px
+from fuel_app.instrument import clear_records, records_frame, summary_frame
+
+# -------------------
+# --- DIAGNOSTICS ---
+# -------------------
+
+# Timings of the pipeline stages and page sections recorded by
+# fuel_app.instrument, for all the sessions of the app process
+
+st.title("Diagnostics")
+
+df_records = records_frame()
+
+if df_records.empty:
+    st.info("No stage recorded yet: open the other pages first.")
+    st.stop()
+
+col1, col2 = st.columns(2)
+
+with col1:
+    st.download_button(
+        "Download the records (CSV)",
+        df_records.to_csv(index=False),
+        file_name="diagnostics.csv",
+        mime="text/csv",
+    )
+
+with col2:
+    if st.button("Clear the records"):
+        clear_records()
+        st.rerun()
+
+# --- Summary by stage ---
+
+df_summary = summary_frame()
+
+st.subheader("Stages")
+st.dataframe(df_summary.style.format(precision=3), use_container_width=True)
+
+fig = px.bar(
+    df_summary.reset_index(),
+    x="Wall total",
+    y="Stage",
+    orientation="h",
+    title="Total wall time by stage (s)",
+)
+st.plotly_chart(fig)
+
+# --- Last runs ---
+
+st.subheader("Last records")
+st.dataframe(df_records.iloc[::-1].head(500), use_container_width=True, hide_index=True)
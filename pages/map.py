@@ -2,75 +2,80 @@
 # --- IMPORTS ---
 # ---------------
 import pandas as pd
-import json
 import streamlit as st
 import folium
-from streamlit_folium import st_folium
 import plotly.express as px
+from streamlit_folium import st_folium
+from fuel_app.data import (
+    load_datasets,
+    load_price_gaps,
+    load_price_grid,
+    load_price_moves,
+    load_station_catalogue,
+    query_prix,
+)
+from fuel_app.charts import add_brand_bands, brand_bands, line_chart
+from fuel_app.gaps import date_gaps, station_gaps
+from fuel_app.heatmap import FRANCE_BOUNDS, GRID_LEVELS, grid_view
+from fuel_app.instrument import timed
+from fuel_app.markers import (
+    price_colormap,
+    price_grid_layer,
+    stations_cluster_layer,
+    stations_layer,
+)
+from fuel_app.moves import competitor_moves
+from fuel_app.schema import FUEL_COLUMNS
 
 # ----------------
 # --- SELECTOR ---
 # ----------------
 
 
-df_stations_carrefour = st.session_state.df_stations_carrefour.sort_values(by="Ville")
-df_stations_others = st.session_state.df_stations_others.sort_values(by="Ville")
-df_prix = st.session_state.df_prix
-df_prix = df_prix.rename(columns={"id": "ID"})
+# Prepared frames shared by all sessions, sorted by city once per process
+datasets = load_datasets()
+df_stations_others = datasets.stations_others
 
-# Load concurrents json file
-with open("data/processed/Concurrents.json", "r") as f:
-    concurrents_json = json.load(f)
+# Concurrents of each Carrefour station, computed at startup
+competitor_graph = datasets.competitor_graph
 
 # Date input
 if "selected_date" not in st.session_state:
     st.session_state.selected_date = st.date_input(
         "Select a date",
-        value=df_prix["Date"].max(),
-        min_value=df_prix["Date"].min(),
-        max_value=df_prix["Date"].max(),
+        value=datasets.date_max,
+        min_value=datasets.date_min,
+        max_value=datasets.date_max,
         key="initial_date_input",
     )
 else:
     st.session_state.selected_date = st.date_input(
         "Select a date",
         value=st.session_state.selected_date,
-        min_value=df_prix["Date"].min(),
-        max_value=df_prix["Date"].max(),
+        min_value=datasets.date_min,
+        max_value=datasets.date_max,
         key="initial_date_input",
     )
 
-# Create a list of concatenated strings for the selectbox
-station_options = [
-    f"{row['Adresse']}, {row['Ville']} (ID: {row['ID']})"
-    for index, row in df_stations_carrefour.iterrows()
-]
-
-# Create a mapping from the concatenated string back to the ID
-station_id_mapping = df_stations_carrefour["ID"].values
+# Selectbox options of the Carrefour stations, built once
+station_catalogue = load_station_catalogue(carrefour_only=True)
 
 # If the selected station is not in session state, initialize it
 if "selected_station" not in st.session_state:
-    selected_station_index = st.selectbox(
+    selected_station_label = st.selectbox(
         "Select a station",
-        station_options,
+        station_catalogue.labels,
     )
     # Store the selected ID in session state
-    st.session_state.selected_station = station_id_mapping[
-        station_options.index(selected_station_index)
-    ]
+    st.session_state.selected_station = station_catalogue.id_of(selected_station_label)
 else:
-    selected_station_index = st.selectbox(
+    selected_station_label = st.selectbox(
         "Select a station",
-        station_options,
-        index=station_options.index(
-            f"{df_stations_carrefour[df_stations_carrefour['ID'] == st.session_state.selected_station]['Adresse'].values[0]}, {df_stations_carrefour[df_stations_carrefour['ID'] == st.session_state.selected_station]['Ville'].values[0]} (ID: {st.session_state.selected_station})"
-        ),
+        station_catalogue.labels,
+        index=station_catalogue.index_of(st.session_state.selected_station),
     )
     # Update the selected station ID in session state
-    st.session_state.selected_station = station_id_mapping[
-        station_options.index(selected_station_index)
-    ]
+    st.session_state.selected_station = station_catalogue.id_of(selected_station_label)
 
 # -----------
 # --- MAP ---
@@ -78,72 +83,142 @@ else:
 
 
 # Get selected station details
-selected_station_row = df_stations_carrefour[
-    df_stations_carrefour["ID"] == st.session_state.selected_station
-].iloc[0]
+selected_station_row = station_catalogue.row_of(st.session_state.selected_station)
 selected_lat = selected_station_row["Latitude"]
 selected_lon = selected_station_row["Longitude"]
 
-# Create a Folium map centered on the selected station
-m = folium.Map(location=[selected_lat, selected_lon], zoom_start=12)
-
-# Add a red marker for the selected station
-folium.Marker(
-    location=[selected_lat, selected_lon],
-    popup=f"<b>{selected_station_row['Adresse']}</b><br>{selected_station_row['Ville']}",
-    icon=folium.Icon(color="red"),
-).add_to(m)
-
 # -----------------------
 # --- ADD CONCURRENTS ---
 # -----------------------
 
-# Extract the concurrents ids list from json
-concurrents_ids = concurrents_json[str(st.session_state.selected_station)]
+with timed("Map: concurrents") as stage:
+    # Extract the concurrents ids list, sorted by distance
+    concurrents_ids, concurrents_distances = competitor_graph.neighbours_of(
+        st.session_state.selected_station
+    )
 
-# Add blue markers for concurrents
-for concurrent_id in concurrents_ids:
-    concurrent_row = df_stations_others[df_stations_others["ID"] == concurrent_id].iloc[
-        0
+    # Concurrent stations, in a single lookup
+    df_compared_stations = df_stations_others[
+        df_stations_others["ID"].isin(concurrents_ids)
     ]
-    concurrent_lat = concurrent_row["Latitude"]
-    concurrent_lon = concurrent_row["Longitude"]
+    stage.rows = len(df_compared_stations)
+
+# Optionally add every station, clustered and rendered by the browser
+show_all_stations = st.checkbox("Show all stations in view", key="show_all_stations")
+
+# -------------------
+# --- MAP DISPLAY ---
+# -------------------
+
+# Fuel of the price levels layer
+price_levels_fuel = st.selectbox(
+    "Fuel of the price levels", FUEL_COLUMNS, key="price_levels_fuel"
+)
+
+
+# Map of the selected station (red marker) and its concurrents (blue markers),
+# with the national price levels as a layer that can be switched on and off.
+# The price levels are the cells of the grid pyramid in view, at the finest
+# level that fits it: the view is sent back when the map is moved, which only
+# reruns this fragment. The cells are sent as a dynamic feature group, so the
+# map is not reloaded and keeps its view.
+@st.fragment
+def station_map(df_compared_stations, show_all_stations, date, fuel):
+    # Create a Folium map centered on the selected station
+    m = folium.Map(location=[selected_lat, selected_lon], zoom_start=12)
+
+    # Add a red marker for the selected station
     folium.Marker(
-        location=[concurrent_lat, concurrent_lon],
-        popup=f"<b>{concurrent_row['Enseignes']}</b><br><br>{concurrent_row['Adresse']}<br>{concurrent_row['Ville']}",
-        icon=folium.Icon(color="blue"),
+        location=[selected_lat, selected_lon],
+        popup=f"<b>{selected_station_row['Adresse']}</b><br>{selected_station_row['Ville']}",
+        icon=folium.Icon(color="red"),
     ).add_to(m)
 
-# Display the map
-st_folium(m, width="100%", height=600)
+    # Add blue markers for concurrents, as a single GeoJSON layer
+    stations_layer(df_compared_stations, color="blue", name="Concurrents").add_to(m)
+
+    if show_all_stations:
+        stations_cluster_layer(datasets.stations_all, name="All stations").add_to(m)
+
+    # View of the map at the last interaction (None before the first one)
+    view = st.session_state.get("station_map") or {}
+    bounds = FRANCE_BOUNDS
+    if view.get("bounds"):
+        south_west = view["bounds"]["_southWest"]
+        north_east = view["bounds"]["_northEast"]
+        bounds = [
+            [south_west["lat"], south_west["lng"]],
+            [north_east["lat"], north_east["lng"]],
+        ]
+
+    # Cells of the date and fuel in view, read from the precomputed grid
+    # pyramid
+    with timed("Map: price grid lookup") as stage:
+        df_grid = load_price_grid()
+        grid_level, df_cells = grid_view(df_grid, date, fuel, bounds)
+        stage.rows = len(df_cells)
+
+    colormap = price_colormap(df_grid, date, fuel)
+    colormap.add_to(m)
+    price_levels = folium.FeatureGroup(name="Price levels")
+    price_grid_layer(df_cells, GRID_LEVELS[grid_level], colormap).add_to(price_levels)
+
+    with timed("Map: folium render"):
+        st_folium(
+            m,
+            width="100%",
+            height=600,
+            returned_objects=["bounds"],
+            feature_group_to_add=price_levels,
+            layer_control=folium.LayerControl(),
+            key="station_map",
+        )
+
+
+station_map(
+    df_compared_stations,
+    show_all_stations,
+    st.session_state.selected_date,
+    price_levels_fuel,
+)
 
 # ------------------------
 # --- PRICE COMPARATOR ---
 # ------------------------
 
-# Create a dataframe with selected one and concurrents
-df_selected_station = df_prix[
-    (df_prix["ID"] == int(st.session_state.selected_station))
-    & (df_prix["Date"] == st.session_state.selected_date)
-]
+# Stations to compare: the selected one first, then its concurrents by distance
+compared_ids = [int(st.session_state.selected_station)] + concurrents_ids.tolist()
+compared_rank = {id: rank for rank, id in enumerate(compared_ids)}
 
-df_selected_station["Enseignes"] = "carrefour"
+# Enseigne of each compared station
+compared_enseignes = dict(
+    zip(
+        df_compared_stations["ID"],
+        df_compared_stations["Enseignes"].astype(str),
+    )
+)
+compared_enseignes[int(st.session_state.selected_station)] = "carrefour"
 
-# List to hold dataframes
-dfs = [df_selected_station]
 
-for id in concurrents_ids:
-    df_concurrent = df_prix[
-        (df_prix["ID"] == int(id)) & (df_prix["Date"] == st.session_state.selected_date)
-    ]
-    if not df_concurrent.empty:
-        df_concurrent["Enseignes"] = df_stations_others[df_stations_others["ID"] == id][
-            "Enseignes"
-        ].values[0]
-        dfs.append(df_concurrent)
+# Add the enseigne of each station and order the rows like compared_ids
+def add_enseignes(df):
+    df = df.sort_values(
+        by="ID", key=lambda ids: ids.map(compared_rank), kind="stable"
+    ).reset_index(drop=True)
+    df["Enseignes"] = df["ID"].map(compared_enseignes)
+    return df
+
 
-# Concatenate all dataframes
-df_combined = pd.concat(dfs, ignore_index=True)
+# Create a dataframe with selected one and concurrents, read in one query
+with timed("Map: price table query") as stage:
+    df_combined = add_enseignes(
+        query_prix(
+            ids=compared_ids,
+            start=st.session_state.selected_date,
+            end=st.session_state.selected_date,
+        )
+    )
+    stage.rows = len(df_combined)
 
 # Replace 0 values with NaN
 df_combined = df_combined.replace(0, pd.NA)
@@ -168,6 +243,96 @@ styled_df = df_combined.style.apply(highlight_selected_row, axis=1)
 
 st.dataframe(styled_df, use_container_width=True)
 
+# ----------------------------
+# --- COMPETITIVE POSITION ---
+# ----------------------------
+
+# Gaps of the selected station to its competitors, read from the price gaps
+# computed for the whole network
+with timed("Map: price gaps") as stage:
+    df_gaps = load_price_gaps()
+    df_station_gaps = station_gaps(
+        df_gaps, st.session_state.selected_station, st.session_state.selected_date
+    )
+    stage.rows = len(df_station_gaps)
+
+st.subheader("Competitive position")
+st.dataframe(
+    df_station_gaps.rename(
+        columns={
+            "Weighted_mean": "Weighted mean",
+            "Gap_mean": "Gap to mean",
+            "Gap_min": "Gap to min",
+            "Gap_median": "Gap to median",
+            "Gap_weighted": "Gap to weighted mean",
+            "Percentile": "Percentile rank",
+        }
+    ).style.format(precision=3),
+    use_container_width=True,
+)
+
+# Gaps of all the Carrefour stations on the selected date
+st.download_button(
+    "Export the price gaps of all the Carrefour stations (CSV)",
+    date_gaps(df_gaps, st.session_state.selected_date).to_csv(),
+    file_name=f"price_gaps_{st.session_state.selected_date}.csv",
+    mime="text/csv",
+)
+
+# ------------------------
+# --- COMPETITOR MOVES ---
+# ------------------------
+
+st.subheader("Competitor moves")
+
+min_move_cents = st.number_input(
+    "Minimum price change (cents)",
+    min_value=0.0,
+    value=2.0,
+    step=0.5,
+    key="min_move_cents",
+)
+
+# Price changes of the competitors on the selected date, read from the moves
+# computed once for the whole network
+with timed("Map: competitor moves") as stage:
+    df_moves = load_price_moves()
+    df_network_moves = competitor_moves(
+        df_moves,
+        competitor_graph.to_frame(),
+        st.session_state.selected_date,
+        min_delta=min_move_cents / 100,
+    )
+    df_station_moves = df_network_moves[
+        df_network_moves["ID"] == int(st.session_state.selected_station)
+    ]
+    stage.rows = len(df_network_moves)
+
+st.caption(
+    f"{df_network_moves['ID'].nunique()} Carrefour stations have a competitor "
+    f"whose price changed by {min_move_cents:g} cents or more on "
+    f"{st.session_state.selected_date}."
+)
+st.dataframe(
+    df_station_moves.assign(
+        Enseignes=df_station_moves["Concurrent_ID"].map(compared_enseignes)
+    )[
+        ["Concurrent_ID", "Enseignes", "Distance", "Fuel", "Old", "New", "Delta"]
+    ].style.format(
+        precision=3
+    ),
+    use_container_width=True,
+    hide_index=True,
+)
+
+# Competitor moves of all the Carrefour stations on the selected date
+st.download_button(
+    "Export the competitor moves of all the Carrefour stations (CSV)",
+    df_network_moves.to_csv(index=False),
+    file_name=f"competitor_moves_{st.session_state.selected_date}.csv",
+    mime="text/csv",
+)
+
 # ------------------
 # --- LINE CHART ---
 # ------------------
@@ -179,17 +344,17 @@ with col1:
     if "selected_date" not in st.session_state:
         st.session_state.selected_date = st.date_input(
             "Select a start date",
-            value=df_prix["Date"].max(),
-            min_value=df_prix["Date"].min(),
-            max_value=df_prix["Date"].max(),
+            value=datasets.date_max,
+            min_value=datasets.date_min,
+            max_value=datasets.date_max,
             key="subsequent_date_input",
         )
     else:
         st.session_state.selected_date = st.date_input(
             "Select a start date",
             value=st.session_state.selected_date,
-            min_value=df_prix["Date"].min(),
-            max_value=df_prix["Date"].max(),
+            min_value=datasets.date_min,
+            max_value=datasets.date_max,
             key="subsequent_date_input",
         )
 
@@ -200,7 +365,7 @@ with col2:
             "Select a end date",
             value=st.session_state.selected_date,
             min_value=st.session_state.selected_date,
-            max_value=df_prix["Date"].max(),
+            max_value=datasets.date_max,
             key="subsequent_date_input_end",
         )
     else:
@@ -208,52 +373,58 @@ with col2:
             "Select a end date",
             value=st.session_state.selected_date_end,
             min_value=st.session_state.selected_date,
-            max_value=df_prix["Date"].max(),
+            max_value=datasets.date_max,
             key="subsequent_date_input_end",
         )
 
 # Prepare df
 
-df_selected_station_line = df_prix[
-    (df_prix["ID"] == int(st.session_state.selected_station))
-    & (df_prix["Date"] >= st.session_state.selected_date)
-    & (df_prix["Date"] <= st.session_state.selected_date_end)
-]
-
-df_selected_station_line["Enseignes"] = "carrefour"
-
-dfs_line = [df_selected_station_line]
-
-for id in concurrents_ids:
-    df_concurrent = df_prix[
-        (df_prix["ID"] == int(id))
-        & (df_prix["Date"] >= st.session_state.selected_date)
-        & (df_prix["Date"] <= st.session_state.selected_date_end)
-    ]
-    if not df_concurrent.empty:
-        df_concurrent["Enseignes"] = df_stations_others[df_stations_others["ID"] == id][
-            "Enseignes"
-        ].values[0]
-        dfs_line.append(df_concurrent)
-
-# Concatenate all dataframes
-
-df_combined_line = pd.concat(dfs_line, ignore_index=True)
+with timed("Map: line chart query") as stage:
+    df_combined_line = add_enseignes(
+        query_prix(
+            ids=compared_ids,
+            start=st.session_state.selected_date,
+            end=st.session_state.selected_date_end,
+        )
+    )
+    stage.rows = len(df_combined_line)
 
 # Extract a df with only the selected carburant
 carburant = st.selectbox(
     "Select a fuel type", ["Gazole", "SP95", "SP98", "E10", "E85", "GPLc"]
 )
 
-fig = px.line(
-    df_combined_line,
-    x="Date",
-    y=carburant,
-    color="Enseignes",
-    line_group="ID",
-    hover_name="Enseignes",
-    color_discrete_sequence=px.colors.sequential.Viridis,
-    markers=True,
-)
+# Competitors grouped by enseigne: one band (mean +/- standard deviation) per
+# enseigne instead of one line per station
+show_bands = st.checkbox("Group competitors by enseigne", key="show_enseigne_bands")
+
+# The lines are downsampled to the width of the chart, see fuel_app.charts
+with timed("Map: line chart"):
+    if show_bands:
+        is_selected = df_combined_line["ID"] == int(st.session_state.selected_station)
+        fig = line_chart(
+            df_combined_line[is_selected],
+            x="Date",
+            y=carburant,
+            color="Enseignes",
+            line_group="ID",
+            hover_name="Enseignes",
+        )
+        add_brand_bands(
+            fig,
+            brand_bands(df_combined_line[~is_selected], "Date", carburant, "Enseignes"),
+            "Date",
+            "Enseignes",
+        )
+    else:
+        fig = line_chart(
+            df_combined_line,
+            x="Date",
+            y=carburant,
+            color="Enseignes",
+            line_group="ID",
+            hover_name="Enseignes",
+            color_discrete_sequence=px.colors.sequential.Viridis,
+        )
 
-st.plotly_chart(fig)
+    st.plotly_chart(fig)
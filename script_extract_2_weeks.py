@@ -1,26 +1,49 @@
+import argparse
 import pandas as pd
 from pathlib import Path
+from fuel_app.extract import CHUNKSIZE, extract_prices
 
-# Load data
+# Parse arguments
 
-df_prix = pd.read_csv(Path.cwd() / "data" / "origin" / "Prix_2024.csv")
-
-# Remove NaN values
-
-df_prix.dropna(inplace=True)
-
-# Convert date column to datetime
-
-df_prix["Date"] = pd.to_datetime(df_prix["Date"], format="%Y-%m-%d")
-
-# Extract data from the last 2 weeks
-
-df_prix_2_weeks = df_prix[
-    df_prix["Date"] >= df_prix["Date"].max() - pd.Timedelta(weeks=2)
-]
+parser = argparse.ArgumentParser(
+    description="Extract a window of daily prices from the yearly price file"
+)
+parser.add_argument(
+    "--source", default=Path.cwd() / "data" / "origin" / "Prix_2024.csv", type=Path
+)
+parser.add_argument(
+    "--output",
+    default=Path.cwd() / "data" / "processed" / "Prix_2_weeks.csv",
+    type=Path,
+)
+parser.add_argument("--days", type=int, help="window size in days")
+parser.add_argument("--weeks", type=int, help="window size in weeks (default: 2)")
+parser.add_argument("--start", help="first date to keep (YYYY-MM-DD)")
+parser.add_argument("--end", help="last date to keep (YYYY-MM-DD)")
+parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+args = parser.parse_args()
+
+# Window to extract: last 2 weeks by default
+
+if args.days is not None:
+    window = pd.Timedelta(days=args.days)
+elif args.weeks is not None:
+    window = pd.Timedelta(weeks=args.weeks)
+elif args.start is None:
+    window = pd.Timedelta(weeks=2)
+else:
+    window = None
+
+# Extract data, reading the source file in chunks
+
+df_prix_window = extract_prices(
+    args.source,
+    start=args.start,
+    end=args.end,
+    window=window,
+    chunksize=args.chunksize,
+)
 
 # Save the extracted data
 
-df_prix_2_weeks.to_csv(
-    Path.cwd() / "data" / "processed" / "Prix_2_weeks.csv", index=False
-)
+df_prix_window.to_csv(args.output, index=False)
@@ -0,0 +1,41 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from fuel_app import build
+from fuel_app.ingest import ingest_prix
+from fuel_app.store import prix_dates
+from fuel_app.synthetic import synthetic_prix, synthetic_stations
+
+# -------------
+# --- TESTS ---
+# -------------
+
+
+# Building the store again from the extract keeps the days added by ingestion
+def test_build_prix_store_keeps_ingested_days(tmp_path, monkeypatch):
+    stations_path = tmp_path / "stations.csv"
+    prix_path = tmp_path / "prix.csv"
+    root = tmp_path / "prix"
+    df_stations_raw = synthetic_stations(300, seed=0)
+    df_stations_raw.to_csv(stations_path, index=False)
+    df_prix = synthetic_prix(df_stations_raw, 16, start="2024-11-01", seed=0)
+    df_prix[df_prix["Date"] <= "2024-11-15"].to_csv(prix_path, index=False)
+    monkeypatch.setattr(build, "PRIX_PATH", prix_path)
+    monkeypatch.setattr(build, "PRIX_STORE_PATH", root)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        build.build_prix_store(pool, None)
+        ingest_prix(
+            df_prix[df_prix["Date"] == "2024-11-16"],
+            window_days=15,
+            root=root,
+            aggregates=tmp_path / "aggregates",
+            stations_path=stations_path,
+            prix_path=prix_path,
+        )
+        build.build_prix_store(pool, None)
+
+    assert prix_dates(root) == list(pd.date_range("2024-11-02", "2024-11-16"))
@@ -0,0 +1,98 @@
+# ---------------
+# --- IMPORTS ---
+# ---------------
+
+import numpy as np
+import pandas as pd
+import pytest
+from fuel_app.cube import build_price_cube
+from fuel_app.data import prepare_stations, signature_digest, store_signature
+from fuel_app.ingest import ingest_prix
+from fuel_app.moves import price_moves
+from fuel_app.store import prix_dates, read_aggregate, read_prix
+from fuel_app.synthetic import synthetic_prix, synthetic_stations
+
+# -------------
+# --- TESTS ---
+# -------------
+
+
+# Re-ingesting a batch that overlaps the retention cutoff: the first date is
+# both replaced and out of the window, it must be removed once. There is no
+# store yet, it is first filled from the extract.
+def test_ingest_overlapping_cutoff(tmp_path):
+    stations_path = tmp_path / "stations.csv"
+    prix_path = tmp_path / "prix.csv"
+    root = tmp_path / "prix"
+    aggregates = tmp_path / "aggregates"
+    df_stations_raw = synthetic_stations(300, seed=0)
+    df_stations_raw.to_csv(stations_path, index=False)
+    df_prix = synthetic_prix(df_stations_raw, 16, start="2024-11-01", seed=0)
+    df_prix[df_prix["Date"] <= "2024-11-15"].to_csv(prix_path, index=False)
+
+    ingest_prix(
+        df_prix,
+        window_days=15,
+        root=root,
+        aggregates=aggregates,
+        stations_path=stations_path,
+        prix_path=prix_path,
+    )
+
+    assert prix_dates(root) == list(pd.date_range("2024-11-02", "2024-11-16"))
+
+    # The updated cube is the cube of the store
+    cube = read_aggregate(aggregates, "cube", signature_digest(store_signature(root)))
+    expected = build_price_cube(read_prix(root), prepare_stations(df_stations_raw))
+    assert cube is not None
+    assert np.allclose(cube["Mean"], expected["Mean"])
+    assert (cube["Count"].to_numpy() == expected["Count"].to_numpy()).all()
+
+
+# Without a store nor an extract to fill it from, nothing is written
+def test_ingest_without_store(tmp_path):
+    stations_path = tmp_path / "stations.csv"
+    df_stations_raw = synthetic_stations(50, seed=0)
+    df_stations_raw.to_csv(stations_path, index=False)
+
+    with pytest.raises(FileNotFoundError, match="fuel_app.build prix_store"):
+        ingest_prix(
+            synthetic_prix(df_stations_raw, 1, seed=0),
+            root=tmp_path / "prix",
+            aggregates=tmp_path / "aggregates",
+            stations_path=stations_path,
+            prix_path=tmp_path / "missing.csv",
+        )
+    assert not (tmp_path / "prix").exists()
+
+
+# The moves saved by ingestion are the moves of the prices of the store, both
+# when the new days are added to the saved moves and when days left the window
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_ingest_moves_match_rebuild(tmp_path):
+    stations_path = tmp_path / "stations.csv"
+    prix_path = tmp_path / "prix.csv"
+    root = tmp_path / "prix"
+    aggregates = tmp_path / "aggregates"
+    df_stations_raw = synthetic_stations(300, seed=0)
+    df_stations_raw.to_csv(stations_path, index=False)
+    df_prix = synthetic_prix(df_stations_raw, 16, start="2024-11-01", seed=0)
+    df_prix[df_prix["Date"] <= "2024-11-10"].to_csv(prix_path, index=False)
+
+    kwargs = dict(
+        window_days=12,
+        root=root,
+        aggregates=aggregates,
+        stations_path=stations_path,
+        prix_path=prix_path,
+    )
+    for date in ["2024-11-11", "2024-11-12", "2024-11-13", "2024-11-14"]:
+        ingest_prix(df_prix[df_prix["Date"] == date], **kwargs)
+
+        moves = read_aggregate(
+            aggregates, "moves", signature_digest(store_signature(root))
+        )
+        # Parquet stores the dates in ms, compare the values of the index only
+        pd.testing.assert_frame_equal(
+            moves, price_moves(read_prix(root)), check_index_type=False
+        )